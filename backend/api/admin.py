@@ -1,3 +1,12 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ["id", "name", "status", "attempts", "run_at", "created_at", "finished_at"]
+    list_filter = ["status", "name"]
+    search_fields = ["name", "dedupe_key"]
+    readonly_fields = ["attempts", "locked_by", "locked_at", "last_error", "created_at", "finished_at"]
+    ordering = ["-id"]
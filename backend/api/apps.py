@@ -4,4 +4,6 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     name = "api"
     def ready(self):
-        import api.signals
\ No newline at end of file
+        import api.signals
+        import api.tasks
+        import api.timing
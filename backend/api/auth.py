@@ -0,0 +1,164 @@
+"""
+JWTs carrying the user's role, staff flags and assigned tag ids, so authenticating a request
+and checking its permissions needs no database query.
+
+Every token records the user's claims version (a stamp in the shared cache, like the
+response cache versions in api/cache.py). Role, tag or account changes bump the stamp;
+a token with an older version is still accepted, but the user is then read from the
+database until the client refreshes its access token, which carries the new claims.
+"""
+from dataclasses import dataclass
+
+from django.contrib.auth.models import User
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .cache import bump_resources, resource_versions
+from .models import AccountType, Profile, RedactorTagAssignment
+
+CLAIMS_RESOURCE = "claims:{}"
+
+
+def claims_version(user_id):
+    return resource_versions([CLAIMS_RESOURCE.format(user_id)])[0]
+
+
+def invalidate_claims(user_id):
+    """Makes the user's current tokens fall back to the database once the transaction commits."""
+    bump_resources(CLAIMS_RESOURCE.format(user_id))
+
+
+@dataclass(frozen=True)
+class Principal:
+    """What permission checks need to know about the authenticated user."""
+    user_id: int
+    role: str
+    is_staff: bool
+    is_superuser: bool
+    tag_ids: tuple
+
+    @property
+    def is_redactor(self):
+        return self.role == AccountType.REDACTOR
+
+    @classmethod
+    def from_user(cls, user):
+        profile = getattr(user, "profile", None)
+        return cls(
+            user_id=user.pk,
+            role=profile.user_type if profile else AccountType.STANDARD,
+            is_staff=user.is_staff,
+            is_superuser=user.is_superuser,
+            tag_ids=tuple(sorted(user.assigned_tags.values_list("tag_id", flat=True))),
+        )
+
+
+def get_principal(user):
+    """The principal of an authenticated user, derived from the database when the token had none."""
+    principal = getattr(user, "principal", None)
+    if principal is None:
+        principal = user.principal = Principal.from_user(user)
+    return principal
+
+
+def user_claims(user):
+    # the version is read first, so a change made meanwhile leaves these claims outdated, not wrong
+    version = claims_version(user.pk)
+    principal = Principal.from_user(user)
+    profile = getattr(user, "profile", None)
+    return {
+        "username": user.username,
+        "profile_id": profile.pk if profile else None,
+        "role": principal.role,
+        "is_staff": principal.is_staff,
+        "is_superuser": principal.is_superuser,
+        "tag_ids": list(principal.tag_ids),
+        "cv": version,
+    }
+
+
+class ClaimsRefreshToken(RefreshToken):
+    """Refresh token whose access tokens inherit the user's claims."""
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        for claim, value in user_claims(user).items():
+            token[claim] = value
+        return token
+
+
+class ClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    token_class = ClaimsRefreshToken
+
+
+class ClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    """Issues the new access token with the current claims instead of the ones from login."""
+    token_class = ClaimsRefreshToken
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs["refresh"])
+        user = User.objects.select_related("profile").filter(
+            **{api_settings.USER_ID_FIELD: refresh.payload.get(api_settings.USER_ID_CLAIM)}
+        ).first()
+        if not api_settings.USER_AUTHENTICATION_RULE(user):
+            raise AuthenticationFailed(self.error_messages["no_active_account"], "no_active_account")
+
+        for claim, value in user_claims(user).items():
+            refresh[claim] = value
+        data = {"access": str(refresh.access_token)}
+
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            data["refresh"] = str(refresh)
+        return data
+
+
+def _not_loaded(*args, **kwargs):
+    raise TypeError("This user was built from token claims and lacks most columns; load it from the database to change it.")
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    Builds request.user from the token's claims when they are current, with the profile
+    and assigned tags filled in; otherwise loads the user like JWTAuthentication does.
+    Such a user lacks the other columns (password, email, ...), so it and its profile refuse
+    to be saved or deleted: load the user from the database to change it.
+    """
+
+    def get_user(self, validated_token):
+        if "cv" not in validated_token or api_settings.CHECK_REVOKE_TOKEN:
+            return super().get_user(validated_token)
+
+        # simplejwt keeps the claim as a string; a str pk would never compare equal to a loaded User
+        user_id = User._meta.pk.to_python(validated_token[api_settings.USER_ID_CLAIM])
+        if validated_token["cv"] != claims_version(user_id):
+            return super().get_user(validated_token)
+
+        principal = Principal(
+            user_id=user_id,
+            role=validated_token["role"],
+            is_staff=validated_token["is_staff"],
+            is_superuser=validated_token["is_superuser"],
+            tag_ids=tuple(validated_token["tag_ids"]),
+        )
+        user = User(id=user_id, username=validated_token["username"], is_staff=principal.is_staff,
+                    is_superuser=principal.is_superuser, is_active=True)
+        user._state.adding = False
+        user._state.db = "default"
+        user.principal = principal
+        user.profile = Profile(id=validated_token["profile_id"], user=user, user_type=principal.role)
+        for obj in (user, user.profile):
+            obj.save = obj.delete = _not_loaded
+
+        # filled the way prefetch_related does, so user.assigned_tags.all() needs no query
+        assigned_tags = user.assigned_tags.all()
+        assigned_tags._result_cache = [RedactorTagAssignment(redactor=user, tag_id=tag_id) for tag_id in principal.tag_ids]
+        assigned_tags._prefetch_done = True
+        user._prefetched_objects_cache = {"assigned_tags": assigned_tags}
+        return user
@@ -0,0 +1,221 @@
+import math
+import platform
+import time
+import tracemalloc
+from dataclasses import dataclass, field
+from datetime import timedelta
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+
+from .auth import ClaimsRefreshToken
+from .models import AccountType, Application, Entry, Request, Tag, Upvote
+from .seeding import SEED_PASSWORD, SEED_PREFIX
+
+ROLES = ("anonymous", "user", "redactor", "admin")
+
+
+@dataclass(frozen=True)
+class Endpoint:
+    name: str
+    path: str
+    role: str = "anonymous"
+    method: str = "get"
+    data: dict = field(default=None, hash=False)
+
+    @property
+    def writes(self):
+        return self.method != "get"
+
+
+def _first_user(**filters):
+    users = User.objects.filter(**filters).order_by("pk")
+    return users.filter(username__startswith=SEED_PREFIX).first() or users.first()
+
+
+def pick_fixtures():
+    """The users and rows the endpoints are called with; seeded users are preferred."""
+    return {
+        "user": _first_user(is_staff=False, profile__user_type=AccountType.STANDARD),
+        "redactor": _first_user(is_staff=False, profile__user_type=AccountType.REDACTOR, assigned_tags__isnull=False),
+        "admin": User.objects.filter(is_staff=True).order_by("pk").first(),
+        "entry": Entry.objects.order_by("-pk").first(),
+        "open_request": Request.objects.filter(entry_id__isnull=True).order_by("-pk").first(),
+        "tag": Tag.objects.order_by("pk").first(),
+        "application": Application.objects.order_by("-pk").first(),
+    }
+
+
+def build_endpoints(fixtures):
+    """Every API endpoint with the role it is called as; endpoints whose rows are missing are left out."""
+    entry, request, tag = fixtures["entry"], fixtures["open_request"], fixtures["tag"]
+    user, application = fixtures["user"], fixtures["application"]
+    since = (timezone.now() - timedelta(days=30)).date().isoformat()
+
+    endpoints = [
+        Endpoint("entries", "/api/entries/"),
+        Endpoint("entries (user)", "/api/entries/", role="user"),
+        Endpoint("ranking", "/api/ranking/"),
+        Endpoint("entry ranking", "/api/ranking/entries/"),
+        Endpoint("categories", "/api/categories/"),
+        Endpoint("search entries", "/api/search/?q=claim"),
+        Endpoint("search requests", "/api/search/?q=claim&type=request", role="redactor"),
+        Endpoint("export", f"/api/entries/export/?output=ndjson&since={since}"),
+        Endpoint("current user", "/api/users/me/", role="user"),
+        Endpoint("users", "/api/users/", role="admin"),
+        Endpoint("requests", "/api/requests/", role="admin"),
+        Endpoint("unassigned requests", "/api/requests/unassigned/", role="redactor"),
+        Endpoint("unassigned requests (admin)", "/api/requests/unassigned/", role="admin"),
+        Endpoint("assigned requests", "/api/requests/assigned/", role="redactor"),
+        Endpoint("closed requests", "/api/requests/closed/", role="admin"),
+        Endpoint("applications", "/api/applications/", role="admin"),
+        Endpoint("jobs", "/api/jobs/", role="admin"),
+        Endpoint("create request", "/api/requests/", role="user", method="post", data={
+            "title": "Benchmark request", "content": "Benchmark request.", "articles": ["https://example.com/benchmark"],
+            "tag_ids": [tag.pk] if tag else [],
+        }),
+    ]
+    if entry:
+        endpoints += [
+            Endpoint("entry", f"/api/entries/{entry.pk}/"),
+            Endpoint("upvote", f"/api/entries/{entry.pk}/upvote/", role="user", method="post"),
+        ]
+    if tag:
+        endpoints.append(Endpoint("category", f"/api/categories/{tag.pk}/"))
+    if request:
+        endpoints += [
+            Endpoint("request", f"/api/requests/{request.pk}/", role="redactor"),
+            Endpoint("assign request", f"/api/requests/{request.pk}/assign/", role="redactor", method="post"),
+            Endpoint("create entry", "/api/entries/", role="redactor", method="post", data={
+                "request_id": request.pk, "title": "Benchmark entry", "content": "Benchmark verdict.", "is_truthful": False,
+                "sources": ["https://example.com/source"], "articles": [], "tag_ids": [tag.pk] if tag else [],
+            }),
+        ]
+    if user:
+        endpoints.append(Endpoint("user", f"/api/users/{user.pk}/", role="admin"))
+        if user.username.startswith(SEED_PREFIX):
+            endpoints.append(Endpoint("token", "/api/auth/token/", method="post",
+                                      data={"username": user.username, "password": SEED_PASSWORD}))
+    if application:
+        endpoints += [
+            Endpoint("application", f"/api/applications/{application.pk}/", role="admin"),
+            Endpoint("accepted application", f"/api/users/{application.author_id}/request/", role="admin"),
+        ]
+    return [endpoint for endpoint in endpoints if endpoint.role == "anonymous" or fixtures[endpoint.role]]
+
+
+def _clients(fixtures):
+    # a host the site accepts, since this doesn't run under the test runner
+    host = next((host.lstrip(".") for host in settings.ALLOWED_HOSTS if host not in ("", "*")), "localhost")
+    clients = {"anonymous": Client(HTTP_HOST=host)}
+    for role in ROLES[1:]:
+        user = fixtures[role]
+        if user is not None:
+            token = ClaimsRefreshToken.for_user(user).access_token
+            clients[role] = Client(HTTP_HOST=host, HTTP_AUTHORIZATION=f"Bearer {token}")
+    return clients
+
+
+def _call(client, endpoint):
+    """One request, with its body read in full; writes are rolled back so every call sees the same data."""
+    with transaction.atomic():
+        if endpoint.writes:
+            response = getattr(client, endpoint.method)(endpoint.path, endpoint.data, content_type="application/json")
+        else:
+            response = client.get(endpoint.path)
+        if response.streaming:
+            b"".join(response.streaming_content)
+        if endpoint.writes:
+            transaction.set_rollback(True)
+    return response
+
+
+def percentile(ordered, p):
+    """Nearest-rank percentile of an already sorted list."""
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def measure(client, endpoint, iterations, warmup):
+    for _ in range(warmup):
+        _call(client, endpoint)
+
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        response = _call(client, endpoint)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+
+    # queries and allocations are counted on a separate call, so the tracing doesn't skew the timings
+    tracemalloc.start()
+    try:
+        with CaptureQueriesContext(connection) as queries:
+            _call(client, endpoint)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "method": endpoint.method.upper(),
+        "path": endpoint.path,
+        "role": endpoint.role,
+        "status": response.status_code,
+        "iterations": iterations,
+        "mean_ms": round(sum(timings) / len(timings), 3),
+        "p50_ms": round(percentile(timings, 50), 3),
+        "p95_ms": round(percentile(timings, 95), 3),
+        "p99_ms": round(percentile(timings, 99), 3),
+        "max_ms": round(timings[-1], 3),
+        "queries": len(queries),
+        "peak_memory_kib": round(peak / 1024, 1),
+    }
+
+
+def run_benchmark(iterations=50, warmup=5, only=None):
+    """
+    Calls every endpoint `iterations` times in-process, through the full middleware, auth and
+    serializer stack of Django's test client, and returns the latency percentiles, queries per
+    request and peak traced memory of each, along with the row counts they ran against.
+    """
+    fixtures = pick_fixtures()
+    clients = _clients(fixtures)
+    endpoints = [endpoint for endpoint in build_endpoints(fixtures) if not only or endpoint.name in only]
+
+    # the same client calling an endpoint hundreds of times would be measuring 429s
+    with override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, "DEFAULT_THROTTLE_RATES": {}}):
+        results = {endpoint.name: measure(clients[endpoint.role], endpoint, iterations, warmup) for endpoint in endpoints}
+
+    return {
+        "meta": {
+            "date": timezone.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "database": connection.vendor,
+            "iterations": iterations,
+            "warmup": warmup,
+            "rows": {model.__name__.lower(): model.objects.count()
+                     for model in (User, Entry, Request, Upvote, Tag, Application)},
+        },
+        "endpoints": results,
+    }
+
+
+def compare(previous, current, keys=("p95_ms", "queries", "peak_memory_kib")):
+    """Per endpoint in both runs: (name, key, before, after, relative change)."""
+    rows = []
+    for name, after in current["endpoints"].items():
+        before = previous.get("endpoints", {}).get(name)
+        if before is None:
+            continue
+        for key in keys:
+            old, new = before.get(key), after.get(key)
+            if old is None or new is None:
+                continue
+            change = (new - old) / old if old else (0.0 if new == old else math.inf)
+            rows.append((name, key, old, new, change))
+    return rows
@@ -0,0 +1,108 @@
+import hashlib
+import math
+import time
+from functools import wraps
+from inspect import iscoroutinefunction
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.response import Response
+
+VERSION_KEY = "resource-version:{}"
+
+
+def resource_versions(resources):
+    keys = [VERSION_KEY.format(resource) for resource in resources]
+    versions = cache.get_many(keys)
+    missing = {key: time.time_ns() for key in keys if key not in versions}
+    if missing:
+        # a version that was never handed out before, so an evicted stamp can't revive old entries
+        for key, version in missing.items():
+            cache.add(key, version, timeout=None)
+        versions.update(cache.get_many(missing.keys()))
+    return [versions.get(key, 0) for key in keys]
+
+
+def _bump(resources):
+    cache.set_many({VERSION_KEY.format(resource): time.time_ns() for resource in resources}, timeout=None)
+
+
+def bump_resources(*resources):
+    """Invalidates every cached response built from `resources` once the current transaction commits."""
+    transaction.on_commit(lambda: _bump(resources))
+
+
+def _response_key(request, resources):
+    versions = resource_versions(resources)
+    query = "&".join(sorted(f"{k}={v}" for k, values in request.query_params.lists() for v in values))
+    raw = f"{request.path}?{query}|{request.accepted_renderer.format}|{versions}"
+    return "response:" + hashlib.md5(raw.encode()).hexdigest(), versions
+
+
+def _response_timeout(versions):
+    """
+    With read replicas, a response built right after a change may come from a replica that
+    hasn't replayed it yet; it is kept only until the change must have reached every replica
+    in use (REPLICA_MAX_LAG_SECONDS), not for the whole RESPONSE_CACHE_TIMEOUT under the new version.
+    """
+    if settings.DATABASE_REPLICAS:
+        changed = (time.time_ns() - max(versions)) / 1e9
+        if changed < settings.REPLICA_MAX_LAG_SECONDS:
+            return min(settings.RESPONSE_CACHE_TIMEOUT, max(1, math.ceil(settings.REPLICA_MAX_LAG_SECONDS - changed)))
+    return settings.RESPONSE_CACHE_TIMEOUT
+
+
+def cache_anonymous_response(*resources):
+    """
+    Caches successful responses of a read handler for anonymous users. The key includes
+    the current version of every resource the response is built from, so bumping a
+    version (see bump_resources) makes all dependent entries unreachable at once.
+    """
+    def decorator(handler):
+        if iscoroutinefunction(handler):
+            @wraps(handler)
+            async def async_wrapper(view, request, *args, **kwargs):
+                if request.user.is_authenticated:
+                    return await handler(view, request, *args, **kwargs)
+
+                key, versions = await sync_to_async(_response_key)(request, resources)
+                data = await cache.aget(key)
+                if data is not None:
+                    return Response(data, headers={"X-Cache": "HIT"})
+
+                response = await handler(view, request, *args, **kwargs)
+                if response.status_code == 200:
+                    await cache.aset(key, response.data, _response_timeout(versions))
+                    response["X-Cache"] = "MISS"
+                return response
+            async_wrapper.cached_resources = resources
+            return async_wrapper
+
+        @wraps(handler)
+        def wrapper(view, request, *args, **kwargs):
+            if request.user.is_authenticated:
+                return handler(view, request, *args, **kwargs)
+
+            key, versions = _response_key(request, resources)
+            data = cache.get(key)
+            if data is not None:
+                return Response(data, headers={"X-Cache": "HIT"})
+
+            response = handler(view, request, *args, **kwargs)
+            if response.status_code == 200:
+                cache.set(key, response.data, _response_timeout(versions))
+                response["X-Cache"] = "MISS"
+            return response
+        wrapper.cached_resources = resources
+        return wrapper
+    return decorator
+
+
+def has_cached_response(request, handler):
+    """Whether `handler`, decorated with cache_anonymous_response, would answer `request` from the cache."""
+    resources = getattr(handler, "cached_resources", None)
+    if resources is None or request.user.is_authenticated:
+        return False
+    return cache.has_key(_response_key(request, resources)[0])
@@ -0,0 +1,118 @@
+import csv
+import json
+from datetime import datetime, time
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import Entry
+from .tags import serialize_tags
+
+EXPORT_FIELDS = ["id", "title", "verdict", "sources", "articles", "tags", "upvotes", "created_at"]
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+CHUNK_SIZE = 1000
+
+
+def parse_since(value):
+    """Accepts an ISO date or datetime; returns None for anything unparseable."""
+    try:
+        since = parse_datetime(value)
+        if since is None:
+            since = parse_date(value)
+            since = since and datetime.combine(since, time.min)
+    except ValueError:
+        return None
+    # dates and naive datetimes are read in the site's time zone
+    if since is not None and timezone.is_naive(since):
+        since = timezone.make_aware(since)
+    return since
+
+
+def export_queryset(since=None):
+    queryset = Entry.objects.order_by("pk").prefetch_related("assigned_tags")
+    if since is not None:
+        queryset = queryset.filter(created_at__gte=since)
+    return queryset
+
+
+def entry_row(entry):
+    return {
+        "id": entry.id,
+        "title": entry.title,
+        "verdict": "trustworthy" if entry.is_truthful else "not_trustworthy",
+        "sources": entry.sources,
+        "articles": entry.articles,
+        # serialize_tags reloads the catalogue for tags created since this worker last loaded it
+        "tags": [tag["name"] for tag in serialize_tags(row.tag_id for row in entry.assigned_tags.all())],
+        "upvotes": entry.upvotes_count,
+        "created_at": entry.created_at,
+    }
+
+
+def iter_rows(queryset, chunk_size=CHUNK_SIZE):
+    # iterator() keeps only one chunk (and its prefetched tags) in memory at a time
+    for entry in queryset.iterator(chunk_size=chunk_size):
+        yield entry_row(entry)
+
+
+def iter_ndjson(rows):
+    for row in rows:
+        yield json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False) + "\n"
+
+
+class _Echo:
+    """File-like object whose write() hands the formatted line back instead of storing it."""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    for row in rows:
+        yield writer.writerow([
+            row["id"],
+            row["title"],
+            row["verdict"],
+            json.dumps(row["sources"], ensure_ascii=False),
+            json.dumps(row["articles"], ensure_ascii=False),
+            ";".join(row["tags"]),
+            row["upvotes"],
+            row["created_at"].isoformat(),
+        ])
+
+
+def iter_export(export_format, since=None, chunk_size=CHUNK_SIZE):
+    rows = iter_rows(export_queryset(since), chunk_size=chunk_size)
+    if export_format == "csv":
+        return iter_csv(rows)
+    return iter_ndjson(rows)
+
+
+def _batched(lines, size):
+    batch = []
+    for line in lines:
+        batch.append(line)
+        if len(batch) >= size:
+            yield "".join(batch)
+            batch = []
+    if batch:
+        yield "".join(batch)
+
+
+async def aiter_export(lines, batch_size=CHUNK_SIZE):
+    """
+    Async wrapper for ASGI: Django would otherwise buffer a sync iterator completely
+    before sending it. Each step pulls a batch of lines on the request's sync thread.
+    """
+    batches = _batched(lines, batch_size)
+    done = object()
+    next_batch = sync_to_async(lambda: next(batches, done))
+    while (batch := await next_batch()) is not done:
+        yield batch
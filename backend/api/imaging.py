@@ -0,0 +1,40 @@
+"""
+Pillow work for scan renditions. Runs in pool processes, so nothing here may import Django.
+"""
+from io import BytesIO
+
+from PIL import Image, ImageOps
+
+# kind: (bounding box, JPEG quality)
+RENDITIONS = {
+    "thumbnail": ((320, 320), 70),
+    "web": ((1600, 1600), 82),
+}
+
+
+def _flatten(image):
+    # JPEG has no alpha channel; transparent areas become white instead of black
+    if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, "white")
+        background.paste(image, mask=image.getchannel("A"))
+        return background
+    if image.mode not in ("RGB", "L"):
+        return image.convert("RGB")
+    return image
+
+
+def render(image, box, quality):
+    """Returns (jpeg bytes, width, height) of the image scaled down to fit in the box."""
+    copy = image.copy()
+    copy.thumbnail(box, Image.Resampling.LANCZOS)  # never enlarges
+    buffer = BytesIO()
+    copy.save(buffer, "JPEG", quality=quality, optimize=True, progressive=True)
+    return buffer.getvalue(), copy.width, copy.height
+
+
+def render_all(path):
+    """Decodes the scan once and renders every kind from it."""
+    with Image.open(path) as image:
+        image = _flatten(ImageOps.exif_transpose(image))
+        return {kind: render(image, box, quality) for kind, (box, quality) in RENDITIONS.items()}
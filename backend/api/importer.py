@@ -0,0 +1,202 @@
+import json
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+
+from django.contrib.auth.models import User
+from django.db import DatabaseError, transaction
+
+from .cache import bump_resources
+from .metrics import ENTRIES_CREATED, count_on_commit
+from .models import Entry, EntryTagAssignment, Request, RequestTagAssignment, Tag
+from .ranking import apply_domain_delta, count_domains
+from .search import index_entries, index_requests
+from .serializers import EntryImportSerializer, RequestImportSerializer, TagImportSerializer
+
+BATCH_SIZE = 500
+RECORD_SERIALIZERS = {
+    "entry": EntryImportSerializer,
+    "request": RequestImportSerializer,
+    "tag": TagImportSerializer,
+}
+MAX_REPORTED_REJECTS = 100
+
+
+@dataclass
+class ImportReport:
+    created: Counter = field(default_factory=Counter)
+    rejected: list = field(default_factory=list)
+    lines: int = 0
+    seconds: float = 0.0
+
+    def reject(self, line, errors):
+        self.rejected.append({"line": line, "errors": errors})
+
+    @property
+    def rows_per_second(self):
+        total = sum(self.created.values())
+        return round(total / self.seconds, 1) if self.seconds else float(total)
+
+    def as_dict(self):
+        return {
+            "created": dict(self.created),
+            "lines": self.lines,
+            "rejected_count": len(self.rejected),
+            "rejected": self.rejected[:MAX_REPORTED_REJECTS],
+            "seconds": round(self.seconds, 3),
+            "rows_per_second": self.rows_per_second,
+        }
+
+
+def import_records(lines, default_author=None, batch_size=BATCH_SIZE):
+    """
+    Imports NDJSON lines (str or bytes) of entries, requests and tags. Every line is an
+    object with a "type" of "entry" (the default, so api/export.py output imports as is),
+    "request" or "tag". Lines are validated one by one and written in batches, each batch
+    in its own transaction; a batch that fails in the database is rejected as a whole.
+    """
+    report = ImportReport()
+    started = time.perf_counter()
+
+    batch = []
+    for number, line in enumerate(lines, start=1):
+        report.lines = number
+        record = _parse_line(number, line, report)
+        if record is not None:
+            batch.append(record)
+        if len(batch) >= batch_size:
+            _import_batch(batch, default_author, report)
+            batch = []
+    if batch:
+        _import_batch(batch, default_author, report)
+
+    report.seconds = time.perf_counter() - started
+    return report
+
+
+def _parse_line(number, line, report):
+    if isinstance(line, bytes):
+        line = line.decode("utf-8-sig")
+    line = line.strip()
+    if not line:
+        return None
+
+    try:
+        data = json.loads(line)
+    except ValueError as e:
+        report.reject(number, f"Invalid JSON: {e}")
+        return None
+    if not isinstance(data, dict):
+        report.reject(number, "Expected a JSON object.")
+        return None
+
+    kind = data.get("type", "entry")
+    serializer_class = RECORD_SERIALIZERS.get(kind)
+    if serializer_class is None:
+        report.reject(number, f"Unknown record type {kind!r}.")
+        return None
+
+    serializer = serializer_class(data=data)
+    if not serializer.is_valid():
+        report.reject(number, serializer.errors)
+        return None
+    return number, kind, serializer.validated_data
+
+
+def _import_batch(batch, default_author, report):
+    authors = _resolve_authors(batch, default_author)
+    records = []
+    for number, kind, data in batch:
+        if kind != "tag" and authors.get(data.get("author")) is None:
+            report.reject(number, {"author": [f"Unknown user {data.get('author')!r}."]})
+        else:
+            records.append((number, kind, data))
+
+    try:
+        with transaction.atomic():
+            created = _write_batch(records, authors)
+    except DatabaseError as e:
+        for number, _, _ in records:
+            report.reject(number, f"Batch rolled back: {e}")
+        return
+    report.created.update(created)
+
+
+def _resolve_authors(batch, default_author):
+    usernames = {data["author"] for _, kind, data in batch if kind != "tag" and "author" in data}
+    authors = {user.username: user for user in User.objects.filter(username__in=usernames)}
+    authors[None] = default_author
+    return authors
+
+
+def _resolve_tags(records):
+    """
+    Tag ids by name; names not seen before are created in one insert. A name another import or
+    an admin creates meanwhile is skipped by the insert and read back with the others.
+    """
+    names = set()
+    for _, kind, data in records:
+        names.update([data["name"]] if kind == "tag" else data["tags"])
+
+    tag_ids = dict(Tag.objects.filter(name__in=names).values_list("name", "pk"))
+    missing = sorted(names - tag_ids.keys())
+    if missing:
+        Tag.objects.bulk_create([Tag(name=name) for name in missing], ignore_conflicts=True)
+        tag_ids.update(Tag.objects.filter(name__in=missing).values_list("name", "pk"))
+    return tag_ids, len(missing)
+
+
+def _insert(model, rows, assignment_model, assignment_field, tag_ids, authors):
+    objects, tag_names, created_at = [], [], []
+    for data in rows:
+        data = dict(data)
+        tag_names.append(data.pop("tags"))
+        created_at.append(data.pop("created_at", None))
+        author = authors[data.pop("author", None)]
+        objects.append(model(author=author, **data))
+
+    objects = model.objects.bulk_create(objects)
+
+    # created_at is auto_now_add, so imported timestamps have to be written afterwards
+    dated = []
+    for obj, value in zip(objects, created_at):
+        if value is not None:
+            obj.created_at = value
+            dated.append(obj)
+    if dated:
+        model.objects.bulk_update(dated, ["created_at"])
+
+    assignment_model.objects.bulk_create([
+        assignment_model(**{assignment_field: obj, "tag_id": tag_ids[name]})
+        for obj, names in zip(objects, tag_names)
+        for name in dict.fromkeys(names)
+    ])
+    return objects
+
+
+def _write_batch(records, authors):
+    # bulk_create bypasses the model signals, so search, ranking and caches are updated here
+    tag_ids, new_tags = _resolve_tags(records)
+    created = Counter(tag=new_tags)
+
+    rows = [data for _, kind, data in records if kind == "request"]
+    if rows:
+        requests = _insert(Request, rows, RequestTagAssignment, "request", tag_ids, authors)
+        index_requests(requests)
+        created["request"] = len(requests)
+
+    rows = [data for _, kind, data in records if kind == "entry"]
+    if rows:
+        entries = _insert(Entry, rows, EntryTagAssignment, "entry", tag_ids, authors)
+        index_entries(entries)
+        domains = Counter()
+        for entry in entries:
+            domains.update(count_domains(entry.is_truthful, entry.articles))
+        apply_domain_delta(domains)
+        bump_resources("entries", "ranking")
+        count_on_commit(ENTRIES_CREATED, len(entries))
+        created["entry"] = len(entries)
+
+    if new_tags:
+        bump_resources("tags")
+    return +created
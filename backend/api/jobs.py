@@ -0,0 +1,146 @@
+"""
+A small job queue kept in the database, so slow work can leave the request path without
+an external broker. Producers call `enqueue` (or `<task>.enqueue`); `manage.py runworker`
+claims queued jobs with a conditional UPDATE, which works the same on SQLite and PostgreSQL.
+"""
+import logging
+import os
+import random
+import socket
+import traceback
+from datetime import timedelta
+from functools import partial
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Min
+from django.utils import timezone
+
+from .models import Job, JobStatus
+
+logger = logging.getLogger(__name__)
+
+JOBS = {}
+BACKOFF_BASE = 5  # seconds, doubled per failed attempt
+BACKOFF_MAX = 60 * 60
+LOCK_TIMEOUT = timedelta(minutes=15)  # running jobs older than this belong to a dead worker
+
+
+def job(name, max_attempts=5):
+    """Registers a function as a job; the function gets `job.enqueue(**payload)`."""
+    def decorator(func):
+        JOBS[name] = func
+        func.enqueue = partial(enqueue, name, max_attempts=max_attempts)
+        return func
+    return decorator
+
+
+def enqueue(name, dedupe_key=None, run_at=None, max_attempts=5, **payload):
+    """
+    Queues a job; the payload must be JSON serializable. With a dedupe_key, a job with
+    the same key that is still waiting is returned instead of queueing another one.
+    Queued inside a transaction, the job only becomes visible to workers on commit.
+    """
+    if name not in JOBS:
+        raise LookupError(f"Unknown job {name!r}.")
+    try:
+        with transaction.atomic():
+            return Job.objects.create(name=name, payload=payload, dedupe_key=dedupe_key,
+                                      run_at=run_at or timezone.now(), max_attempts=max_attempts)
+    except IntegrityError:
+        if dedupe_key is None:
+            raise
+        return Job.objects.filter(dedupe_key=dedupe_key, status=JobStatus.QUEUED).first()
+
+
+def worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def claim(worker):
+    """Marks the next due job as running for this worker; None if nothing is due."""
+    now = timezone.now()
+    due = Job.objects.filter(status=JobStatus.QUEUED, run_at__lte=now).order_by("run_at", "id")
+    for pk in due.values_list("pk", flat=True)[:10]:
+        # only one worker's UPDATE can still see the job as queued
+        claimed = Job.objects.filter(pk=pk, status=JobStatus.QUEUED).update(
+            status=JobStatus.RUNNING, locked_by=worker, locked_at=now, attempts=F("attempts") + 1
+        )
+        if claimed:
+            return Job.objects.get(pk=pk)
+    return None
+
+
+def backoff(attempts):
+    delay = min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX)
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+def run(job):
+    func = JOBS.get(job.name)
+    try:
+        if func is None:
+            raise LookupError(f"Unknown job {job.name!r}.")
+        func(**job.payload)
+    except Exception:
+        job.last_error = traceback.format_exc()
+        if job.attempts >= job.max_attempts:
+            logger.error("Job %s failed permanently", job, exc_info=True)
+            job.status = JobStatus.FAILED
+            job.finished_at = timezone.now()
+        else:
+            logger.warning("Job %s failed, retrying", job, exc_info=True)
+            job.status = JobStatus.QUEUED
+            job.run_at = timezone.now() + backoff(job.attempts)
+    else:
+        job.status = JobStatus.DONE
+        job.finished_at = timezone.now()
+
+    job.locked_by = ""
+    job.locked_at = None
+    _save(job, ["status", "run_at", "locked_by", "locked_at", "last_error", "finished_at"])
+    return job
+
+
+def _save(job, fields):
+    try:
+        with transaction.atomic():
+            job.save(update_fields=fields)
+    except IntegrityError:
+        # back in the queue while a newer job with the same dedupe_key waits: that one wins
+        job.status = JobStatus.FAILED
+        job.finished_at = timezone.now()
+        job.last_error = (job.last_error + "\nSuperseded by a newer job.").strip()
+        job.save(update_fields={*fields, "status", "finished_at", "last_error"})
+
+
+def requeue_stale(timeout=LOCK_TIMEOUT):
+    """Puts jobs of workers that died mid-run back in the queue."""
+    stale = Job.objects.filter(status=JobStatus.RUNNING, locked_at__lt=timezone.now() - timeout)
+    for job in stale:
+        job.status = JobStatus.QUEUED
+        job.locked_by = ""
+        job.locked_at = None
+        _save(job, ["status", "locked_by", "locked_at"])
+    return len(stale)
+
+
+def purge_finished(older_than=timedelta(days=7)):
+    deleted, _ = Job.objects.filter(status=JobStatus.DONE, finished_at__lt=timezone.now() - older_than).delete()
+    return deleted
+
+
+def queue_stats():
+    """Job counts per status and name, plus the age of the oldest due job."""
+    counts = {status: 0 for status in JobStatus.values}
+    by_name = {}
+    for row in Job.objects.values("status", "name").annotate(n=Count("id")).order_by():
+        counts[row["status"]] += row["n"]
+        by_name.setdefault(row["name"], {})[row["status"]] = row["n"]
+
+    now = timezone.now()
+    oldest = Job.objects.filter(status=JobStatus.QUEUED, run_at__lte=now).aggregate(oldest=Min("run_at"))["oldest"]
+    return {
+        "counts": counts,
+        "jobs": by_name,
+        "oldest_due_seconds": round((now - oldest).total_seconds(), 1) if oldest else 0,
+    }
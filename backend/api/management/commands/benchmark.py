@@ -0,0 +1,52 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.benchmark import compare, run_benchmark
+
+
+class Command(BaseCommand):
+    help = ("Calls every API endpoint in-process and reports p50/p95/p99 latency, queries per request "
+            "and peak memory as JSON. Run it against a copy of the database filled by seed_data.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=50)
+        parser.add_argument("--warmup", type=int, default=5)
+        parser.add_argument("--only", action="append", metavar="NAME", help="Benchmark only this endpoint (repeatable).")
+        parser.add_argument("--output", help="Write the JSON results to this file instead of stdout.")
+        parser.add_argument("--compare", metavar="PATH", help="Results of an earlier run to compare against.")
+        parser.add_argument("--threshold", type=float, default=0.2,
+                            help="Relative change reported as a regression with --compare (default 0.2).")
+
+    def handle(self, *args, **options):
+        if options["iterations"] < 1:
+            raise CommandError("--iterations must be at least 1.")
+        previous = None
+        if options["compare"]:
+            try:
+                with open(options["compare"], encoding="utf-8") as f:
+                    previous = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Cannot read {options['compare']}: {e}")
+
+        results = run_benchmark(iterations=options["iterations"], warmup=options["warmup"], only=options["only"])
+        output = json.dumps(results, indent=2, sort_keys=True)
+
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as f:
+                f.write(output + "\n")
+            for name, row in results["endpoints"].items():
+                self.stderr.write(
+                    f"{name:<30} {row['status']} p50 {row['p50_ms']:>8.2f}  p95 {row['p95_ms']:>8.2f}  "
+                    f"p99 {row['p99_ms']:>8.2f} ms  {row['queries']:>3} queries  {row['peak_memory_kib']:>9.1f} KiB"
+                )
+        else:
+            self.stdout.write(output)
+
+        if previous is not None:
+            regressions = 0
+            for name, key, old, new, change in compare(previous, results):
+                if change > options["threshold"]:
+                    regressions += 1
+                    self.stderr.write(self.style.WARNING(f"{name}: {key} {old} -> {new} ({change:+.0%})"))
+            self.stderr.write(f"{regressions} regressions above {options['threshold']:.0%}.")
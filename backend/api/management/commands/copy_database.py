@@ -0,0 +1,107 @@
+import time
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from backend.database import database_from_url
+
+SOURCE_ALIAS = "copy_source"
+
+# Content types and permissions are recreated by `migrate` on the target with different ids,
+# so only the project data (users, groups and everything in `api`) is copied.
+COPIED_MODELS = ["auth.User", "auth.Group", "auth.User_groups"]
+COPIED_APPS = ["api"]
+
+
+def copied_models():
+    models = [apps.get_model(label) for label in COPIED_MODELS]
+    for app_label in COPIED_APPS:
+        models += list(apps.get_app_config(app_label).get_models(include_auto_created=True))
+
+    # parents before children, so foreign keys always point at rows that were already copied
+    ordered = []
+    pending = list(models)
+    while pending:
+        for model in pending:
+            dependencies = {
+                field.related_model for field in model._meta.concrete_fields
+                if field.is_relation and field.related_model is not model
+            }
+            if not dependencies & (set(pending) - {model}):
+                ordered.append(model)
+                pending.remove(model)
+                break
+        else:
+            raise CommandError("Circular foreign keys between copied models.")
+    return ordered
+
+
+class Command(BaseCommand):
+    help = (
+        "Copies all project data from another database (typically the old SQLite file) into the "
+        "configured database in bulk batches. Both databases must be migrated to the same schema "
+        "version; the copied tables on the target are emptied before copying."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("source_url", help="URL of the database to copy from, e.g. sqlite:///DATA/db.sqlite3")
+        parser.add_argument("--database", default=DEFAULT_DB_ALIAS, help="Target database alias.")
+        parser.add_argument("--batch-size", type=int, default=2000)
+        parser.add_argument("--noinput", "--no-input", action="store_false", dest="interactive")
+
+    def handle(self, *args, **options):
+        target = options["database"]
+        batch_size = options["batch_size"]
+
+        configured = connections.configure_settings({
+            DEFAULT_DB_ALIAS: connections.settings[DEFAULT_DB_ALIAS],
+            SOURCE_ALIAS: database_from_url(options["source_url"]),
+        })
+        connections.settings[SOURCE_ALIAS] = configured[SOURCE_ALIAS]
+
+        models = copied_models()
+        target_connection = connections[target]
+
+        if options["interactive"]:
+            answer = input(
+                f"This will DELETE all users and project data in the '{target}' database "
+                f"({target_connection.settings_dict['NAME']}) and replace them with the source data.\n"
+                "Type 'yes' to continue: "
+            )
+            if answer != "yes":
+                raise CommandError("Copy cancelled.")
+
+        started = time.monotonic()
+        with transaction.atomic(using=target):
+            tables = [model._meta.db_table for model in models]
+            for sql in target_connection.ops.sql_flush(no_style(), tables, allow_cascade=True):
+                with target_connection.cursor() as cursor:
+                    cursor.execute(sql)
+
+            for model in models:
+                copied = self.copy_model(model, target, batch_size)
+                self.stdout.write(f"{model._meta.label}: {copied} rows")
+
+            for sql in target_connection.ops.sequence_reset_sql(no_style(), models):
+                with target_connection.cursor() as cursor:
+                    cursor.execute(sql)
+
+        connections[SOURCE_ALIAS].close()
+        self.stdout.write(self.style.SUCCESS(f"Copied {len(models)} tables in {time.monotonic() - started:.1f}s."))
+
+    def copy_model(self, model, target, batch_size):
+        manager = model._base_manager
+        copied = 0
+        batch = []
+        for obj in manager.using(SOURCE_ALIAS).order_by("pk").iterator(chunk_size=batch_size):
+            batch.append(obj)
+            if len(batch) >= batch_size:
+                manager.using(target).bulk_create(batch)
+                copied += len(batch)
+                batch = []
+        if batch:
+            manager.using(target).bulk_create(batch)
+            copied += len(batch)
+        return copied
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.export import EXPORT_FORMATS, iter_export, parse_since
+
+
+class Command(BaseCommand):
+    help = "Streams all entries (optionally only those created since a date) as NDJSON or CSV."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--format", choices=EXPORT_FORMATS, default="ndjson", dest="export_format")
+        parser.add_argument("--since", help="ISO 8601 date or datetime.")
+        parser.add_argument("--output", help="File to write to (default: stdout).")
+        parser.add_argument("--chunk-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        since = None
+        if options["since"]:
+            since = parse_since(options["since"])
+            if since is None:
+                raise CommandError("--since must be an ISO 8601 date or datetime.")
+
+        lines = iter_export(options["export_format"], since=since, chunk_size=options["chunk_size"])
+        if not options["output"]:
+            for line in lines:
+                self.stdout.write(line, ending="")
+            return
+
+        with open(options["output"], "w", encoding="utf-8", newline="") as output:
+            count = 0
+            for line in lines:
+                output.write(line)
+                count += 1
+        self.stderr.write(self.style.SUCCESS(f"Wrote {count} lines to {options['output']}."))
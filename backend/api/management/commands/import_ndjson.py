@@ -0,0 +1,41 @@
+import sys
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from api.importer import BATCH_SIZE, import_records
+
+
+class Command(BaseCommand):
+    help = "Bulk imports entries, requests and tags from NDJSON files (use - for stdin)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="+")
+        parser.add_argument("--author", help="Username for records without an author.")
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        author = None
+        if options["author"]:
+            author = User.objects.filter(username=options["author"]).first()
+            if author is None:
+                raise CommandError(f"Unknown user {options['author']!r}.")
+
+        for path in options["paths"]:
+            if path == "-":
+                report = import_records(sys.stdin, default_author=author, batch_size=options["batch_size"])
+            else:
+                try:
+                    with open(path, encoding="utf-8-sig") as lines:
+                        report = import_records(lines, default_author=author, batch_size=options["batch_size"])
+                except OSError as e:
+                    raise CommandError(str(e))
+
+            for rejected in report.rejected:
+                self.stderr.write(f"{path}:{rejected['line']}: {rejected['errors']}")
+
+            created = ", ".join(f"{kind}: {n}" for kind, n in sorted(report.created.items())) or "nothing"
+            self.stdout.write(self.style.SUCCESS(
+                f"{path}: imported ({created}) from {report.lines} lines in {report.seconds:.2f}s "
+                f"({report.rows_per_second} rows/s), {len(report.rejected)} rejected."
+            ))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from api.ranking import rebuild_domain_counts
+
+
+class Command(BaseCommand):
+    help = "Recomputes the per-domain ranking table from all entries marked as not truthful."
+
+    def handle(self, *args, **options):
+        domains = rebuild_domain_counts()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt ranking for {domains} domains."))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.models import Entry, Request, SearchDocument
+from api.search import index_entries, index_requests, rebuild_text_index
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the full-text search documents for all entries and pending requests."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        sources = [
+            (Entry.objects.order_by("pk"), index_entries),
+            (Request.objects.filter(entry_id__isnull=True).order_by("pk"), index_requests),
+        ]
+
+        with transaction.atomic():
+            SearchDocument.objects.all().delete()
+            for queryset, index in sources:
+                batch = []
+                for obj in queryset.iterator(chunk_size=batch_size):
+                    batch.append(obj)
+                    if len(batch) >= batch_size:
+                        index(batch)
+                        batch = []
+                index(batch)
+            rebuild_text_index()
+
+        self.stdout.write(self.style.SUCCESS(f"Indexed {SearchDocument.objects.count()} documents."))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from api.models import Application
+from api.tasks import render_application_scans
+
+
+class Command(BaseCommand):
+    help = "Queues thumbnail and web renditions for application scans that have none yet."
+
+    def handle(self, *args, **options):
+        application_ids = Application.objects.filter(
+            scans__renditions__isnull=True, scans__isnull=False
+        ).values_list("id", flat=True).distinct()
+
+        for application_id in application_ids:
+            render_application_scans.enqueue(application_id=application_id, dedupe_key=f"scans:{application_id}")
+
+        self.stdout.write(self.style.SUCCESS(f"Queued {len(application_ids)} applications."))
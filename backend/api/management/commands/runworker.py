@@ -0,0 +1,51 @@
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from api.jobs import claim, purge_finished, requeue_stale, run, worker_id
+
+
+class Command(BaseCommand):
+    help = "Runs queued background jobs (see api/jobs.py) until stopped."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sleep", type=float, default=1.0, help="Seconds to wait when the queue is empty.")
+        parser.add_argument("--once", action="store_true", help="Exit when no job is due instead of waiting.")
+        parser.add_argument("--housekeeping", type=int, default=300,
+                            help="Seconds between requeueing stale jobs and purging finished ones.")
+
+    def handle(self, *args, **options):
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        worker = worker_id()
+        self.stdout.write(f"Worker {worker} started.")
+        next_housekeeping = 0
+
+        while not self.stopping:
+            close_old_connections()
+
+            if time.monotonic() >= next_housekeeping:
+                requeue_stale()
+                purge_finished()
+                next_housekeeping = time.monotonic() + options["housekeeping"]
+
+            job = claim(worker)
+            if job is None:
+                if options["once"]:
+                    break
+                time.sleep(options["sleep"])
+                continue
+
+            started = time.perf_counter()
+            job = run(job)
+            self.stdout.write(f"{job} in {time.perf_counter() - started:.2f}s")
+
+        self.stdout.write(f"Worker {worker} stopped.")
+
+    def stop(self, signum, frame):
+        # finish the job at hand, then leave the loop
+        self.stopping = True
@@ -0,0 +1,35 @@
+from dataclasses import fields
+
+from django.core.management.base import BaseCommand
+
+from api.seeding import BATCH_SIZE, SEED_PASSWORD, SeedScale, clear_seeded, seed
+
+
+class Command(BaseCommand):
+    help = "Generates synthetic users, redactors, requests, entries and upvotes for load tests."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scale", type=float, default=1.0,
+                            help="Multiplies the default row counts (1000 users, 5000 entries, 50000 upvotes, ...).")
+        for f in fields(SeedScale):
+            parser.add_argument(f"--{f.name.replace('_', '-')}", type=int, help=f"Overrides the scaled {f.name}.")
+        parser.add_argument("--seed", type=int, default=0, help="Random seed; the same seed gives the same data.")
+        parser.add_argument("--days", type=int, default=365, help="Spread the timestamps over this many days.")
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+        parser.add_argument("--clear", action="store_true", help="Delete previously seeded data first.")
+
+    def handle(self, *args, **options):
+        if options["clear"]:
+            deleted = clear_seeded()
+            self.stdout.write(f"Deleted {deleted} seeded rows.")
+
+        scale = SeedScale().scaled(options["scale"])
+        for f in fields(SeedScale):
+            if options[f.name] is not None:
+                setattr(scale, f.name, options[f.name])
+
+        created = seed(scale, seed=options["seed"], days=options["days"], batch_size=options["batch_size"])
+        summary = ", ".join(f"{kind}: {n}" for kind, n in sorted(created.items())) or "nothing"
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded ({summary}). Seeded users log in with the password {SEED_PASSWORD!r}."
+        ))
@@ -0,0 +1,159 @@
+"""
+Delivery of protected media (application scans) after the permission check.
+
+PROTECTED_MEDIA_DELIVERY picks who sends the bytes:
+  "x-accel"     nginx, via an internal location (see frontend/nginx.conf)
+  "x-sendfile"  Apache/lighttpd, via the absolute file path
+  "django"      this process; gunicorn sends FileResponse files with os.sendfile
+Conditional requests are answered here in every mode, byte ranges in the "django" mode
+(the front servers handle ranges of redirected files themselves).
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, parse_http_date_safe
+
+CHUNK_SIZE = 64 * 1024
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def resolve_media_path(path):
+    """Absolute path of a file inside MEDIA_ROOT; 404 for anything outside it, links included."""
+    root = os.path.realpath(settings.MEDIA_ROOT)
+    full_path = os.path.realpath(os.path.join(root, path))
+    if os.path.commonpath([root, full_path]) != root or not os.path.isfile(full_path):
+        raise Http404
+    return full_path
+
+
+def file_etag(stat):
+    # the format nginx uses for static files, so both servers agree on validators
+    return f'"{int(stat.st_mtime):x}-{stat.st_size:x}"'
+
+
+def parse_range(header, size):
+    """
+    (start, end) of a single byte range, None to send the whole file, or "unsatisfiable".
+    Multiple ranges are answered with the whole file, which RFC 9110 allows.
+    """
+    match = RANGE_RE.match(header.replace(" ", ""))
+    if not match or match.groups() == ("", ""):
+        return None
+    first, last = match.groups()
+    if first and last and int(last) < int(first):
+        # not a valid range at all, so the header is ignored
+        return None
+    if first:
+        start, end = int(first), min(int(last), size - 1) if last else size - 1
+    else:
+        start, end = max(size - int(last), 0), size - 1
+    if start >= size or start > end:
+        return "unsatisfiable"
+    return start, end
+
+
+def _range_applies(request, etag, last_modified):
+    if_range = request.headers.get("If-Range")
+    if not if_range:
+        return True
+    if if_range.startswith(('"', 'W/')):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == int(last_modified)
+
+
+class _RangeReader:
+    """File-like view of part of a file; deliberately without fileno(), so it is read, not sendfile'd."""
+
+    def __init__(self, file, length):
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b""
+        size = self.remaining if size < 0 else min(size, self.remaining)
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+async def _aread(file, length):
+    # ASGI would otherwise buffer a sync file iterator completely before sending it
+    read = sync_to_async(file.read, thread_sensitive=False)
+    try:
+        while length > 0:
+            chunk = await read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        file.close()
+
+
+def _file_response(request, full_path, size, byte_range, content_type):
+    start, end = byte_range or (0, size - 1)
+    length = end - start + 1 if size else 0
+    file = open(full_path, "rb")
+    file.seek(start)
+
+    if isinstance(request, ASGIRequest):
+        response = StreamingHttpResponse(_aread(file, length), content_type=content_type)
+    elif byte_range and end < size - 1:
+        response = FileResponse(_RangeReader(file, length), content_type=content_type)
+    else:
+        # a real file positioned at `start`: gunicorn sends it with os.sendfile
+        response = FileResponse(file, content_type=content_type)
+
+    response["Content-Length"] = str(length)
+    if byte_range:
+        response.status_code = 206
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return response
+
+
+def serve_protected(request, path):
+    full_path = resolve_media_path(path)
+    stat = os.stat(full_path)
+    etag = file_etag(stat)
+    content_type = mimetypes.guess_type(full_path)[0] or "application/octet-stream"
+
+    response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if response is not None:
+        return response
+
+    delivery = settings.PROTECTED_MEDIA_DELIVERY
+    if delivery == "x-accel":
+        response = HttpResponse(content_type=content_type)
+        relative = os.path.relpath(full_path, os.path.realpath(settings.MEDIA_ROOT))
+        response["X-Accel-Redirect"] = settings.PROTECTED_MEDIA_ACCEL_PREFIX + quote(relative)
+    elif delivery == "x-sendfile":
+        response = HttpResponse(content_type=content_type)
+        response["X-Sendfile"] = full_path
+    else:
+        byte_range = None
+        if "Range" in request.headers and _range_applies(request, etag, stat.st_mtime):
+            byte_range = parse_range(request.headers["Range"], stat.st_size)
+        if byte_range == "unsatisfiable":
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{stat.st_size}"
+            return response
+        response = _file_response(request, full_path, stat.st_size, byte_range, content_type)
+        response["Accept-Ranges"] = "bytes"
+
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(stat.st_mtime)
+    response["X-Content-Type-Options"] = "nosniff"
+    # browsers may keep a copy but must revalidate it, which costs a 304 at most
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
@@ -0,0 +1,89 @@
+"""
+Prometheus metrics. Gunicorn workers are separate processes, so with PROMETHEUS_MULTIPROC_DIR
+set (see gunicorn.conf.py) every worker writes its samples to files in that directory and a
+scrape of any worker adds up all of them. Queue sizes are read from the database at scrape time.
+"""
+import os
+import secrets
+
+from django.conf import settings
+from django.db import transaction
+from django.http import HttpResponse
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.multiprocess import MultiProcessCollector
+
+from .jobs import queue_stats
+from .models import Request
+
+REQUESTS = Counter("debunk_http_requests_total", "Requests served, by route and status.",
+                   ["method", "route", "status"])
+LATENCY = Histogram("debunk_http_request_duration_seconds", "Time to build the response, by route.",
+                    ["method", "route"], buckets=(.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10))
+QUERIES = Histogram("debunk_http_request_queries", "Database queries per request, by route.",
+                    ["method", "route"], buckets=(0, 1, 2, 4, 8, 16, 32, 64, 128))
+DB_TIME = Histogram("debunk_http_request_db_seconds", "Time spent in the database per request, by route.",
+                    ["method", "route"], buckets=(.001, .005, .01, .025, .05, .1, .25, .5, 1, 5))
+
+UPVOTES = Counter("debunk_upvotes_total", "Upvotes added and removed.", ["action"])
+CLAIMS = Counter("debunk_request_claims_total", "Requests claimed by redactors.")
+ENTRIES_CREATED = Counter("debunk_entries_created_total", "Entries published.")
+SHED = Counter("debunk_http_requests_shed_total", "Requests answered 503 by the load shedding middleware.", ["reason"])
+REPLICA_FALLBACKS = Counter("debunk_replica_skipped_total", "Reads not sent to a replica because it was down or lagging.",
+                            ["alias", "reason"])
+
+
+def count_on_commit(counter, amount=1, **labels):
+    """Counts once the current transaction commits, so rolled back work isn't counted."""
+    metric = counter.labels(**labels) if labels else counter
+    transaction.on_commit(lambda: metric.inc(amount))
+
+
+def record_request(method, route, status, seconds, timings):
+    """Called by api.timing.RequestTimingMiddleware for every response."""
+    REQUESTS.labels(method, route, status).inc()
+    LATENCY.labels(method, route).observe(seconds)
+    QUERIES.labels(method, route).observe(timings.queries)
+    DB_TIME.labels(method, route).observe(timings.phases["db"])
+
+
+class QueueCollector:
+    """Sizes of the job queue and of the request backlog, read when scraped."""
+
+    def collect(self):
+        stats = queue_stats()
+        jobs = GaugeMetricFamily("debunk_jobs", "Background jobs, by status.", labels=["status"])
+        for status, count in stats["counts"].items():
+            jobs.add_metric([status], count)
+        yield jobs
+        yield GaugeMetricFamily("debunk_jobs_oldest_due_seconds", "How long the oldest due job has waited.",
+                                value=stats["oldest_due_seconds"])
+
+        pending = Request.objects.filter(entry_id__isnull=True)
+        requests = GaugeMetricFamily("debunk_open_requests", "Requests without an entry yet.", labels=["assigned"])
+        requests.add_metric(["false"], pending.filter(redactor__isnull=True).count())
+        requests.add_metric(["true"], pending.filter(redactor__isnull=False).count())
+        yield requests
+
+
+# read from the database by whichever worker is scraped, so kept out of the per-process samples
+_queues = CollectorRegistry()
+_queues.register(QueueCollector())
+
+
+def scrape():
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry) + generate_latest(_queues)
+
+
+def metrics_view(request):
+    """Prometheus text format; with METRICS_TOKEN set, scrapes have to send it as a bearer token."""
+    if settings.METRICS_TOKEN:
+        expected = f"Bearer {settings.METRICS_TOKEN}"
+        if not secrets.compare_digest(request.headers.get("Authorization", ""), expected):
+            return HttpResponse(status=401, headers={"WWW-Authenticate": "Bearer"})
+    return HttpResponse(scrape(), content_type=CONTENT_TYPE_LATEST)
@@ -6,6 +6,7 @@ from django.db import migrations, models
 
 def insert_initial_data(apps, schema_editor):
     Tag = apps.get_model('api', 'Tag')
+    db_alias = schema_editor.connection.alias
     tags = [
         'World',
         'Politics',
@@ -16,7 +17,7 @@ def insert_initial_data(apps, schema_editor):
         'Environment'
     ]
     for tag in tags:
-        Tag.objects.get_or_create(name=tag)
+        Tag.objects.using(db_alias).get_or_create(name=tag)
 
 class Migration(migrations.Migration):
 
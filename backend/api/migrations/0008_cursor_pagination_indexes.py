@@ -0,0 +1,32 @@
+# Generated by Django 6.0 on 2026-10-18 09:29
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_alter_entry_sources_alter_request_articles'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='application',
+            index=models.Index(fields=['created_at', 'id'], name='application_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='entry',
+            index=models.Index(fields=['created_at', 'id'], name='entry_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='request',
+            index=models.Index(fields=['created_at', 'id'], name='request_created_id_idx'),
+        ),
+        # auth.User belongs to another app, so its keyset index is created by hand
+        migrations.RunSQL(
+            sql='CREATE INDEX IF NOT EXISTS api_user_date_joined_id_idx ON auth_user (date_joined, id);',
+            reverse_sql='DROP INDEX IF EXISTS api_user_date_joined_id_idx;',
+        ),
+    ]
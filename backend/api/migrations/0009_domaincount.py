@@ -0,0 +1,58 @@
+# Generated by Django 6.0 on 2026-10-18 09:30
+
+from collections import Counter
+from urllib.parse import urlparse
+
+from django.db import migrations, models
+
+
+# a copy of api.ranking.extract_domain as of this migration, so later changes there don't change it
+def extract_domain(link):
+    if not link:
+        return None
+    try:
+        if "://" not in link:
+            link = "http://" + link
+        domain = urlparse(link).netloc.lower()
+    except Exception:
+        return None
+
+    if domain.startswith('www.'):
+        domain = domain[4:]
+    return domain or None
+
+
+def populate_domain_counts(apps, schema_editor):
+    Entry = apps.get_model("api", "Entry")
+    DomainCount = apps.get_model("api", "DomainCount")
+    db_alias = schema_editor.connection.alias
+
+    domains = Counter()
+    for articles in Entry.objects.using(db_alias).filter(is_truthful=False).values_list("articles", flat=True):
+        domains.update(filter(None, map(extract_domain, articles or [])))
+
+    DomainCount.objects.using(db_alias).bulk_create(
+        [DomainCount(domain=domain, count=count) for domain, count in domains.items()]
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_cursor_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DomainCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('domain', models.CharField(max_length=255, unique=True)),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-count', 'domain'], name='domaincount_count_idx')],
+            },
+        ),
+        migrations.RunPython(populate_domain_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 6.0 on 2026-10-18 09:30
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_upvotes_count(apps, schema_editor):
+    Entry = apps.get_model("api", "Entry")
+    Upvote = apps.get_model("api", "Upvote")
+    db_alias = schema_editor.connection.alias
+
+    counts = Upvote.objects.using(db_alias).filter(entry=OuterRef("pk")).order_by().values("entry").annotate(
+        total=Count("pk")
+    ).values("total")
+    Entry.objects.using(db_alias).update(
+        upvotes_count=Coalesce(Subquery(counts, output_field=IntegerField()), Value(0))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_domaincount'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='entry',
+            name='upvotes_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_upvotes_count, migrations.RunPython.noop),
+    ]
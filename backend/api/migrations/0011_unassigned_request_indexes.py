@@ -0,0 +1,23 @@
+# Generated by Django 6.0 on 2026-10-18 09:31
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_entry_upvotes_count'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='request',
+            index=models.Index(condition=models.Q(('redactor__isnull', True)), fields=['created_at', 'id'], name='request_unassigned_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='requesttagassignment',
+            index=models.Index(fields=['tag', 'request'], name='requesttag_tag_request_idx'),
+        ),
+    ]
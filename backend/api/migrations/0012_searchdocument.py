@@ -0,0 +1,100 @@
+# Generated by Django 6.0 on 2026-10-18 09:32
+
+from django.db import migrations, models
+
+# the text index as of this migration; api/search.py queries it
+FTS_TABLE = "api_searchdocument_fts"
+
+INDEX_SQL = {
+    "sqlite": [
+        f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+            title, body, content='api_searchdocument', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )""",
+        f"""CREATE TRIGGER IF NOT EXISTS api_searchdocument_ai AFTER INSERT ON api_searchdocument BEGIN
+            INSERT INTO {FTS_TABLE}(rowid, title, body) VALUES (new.id, new.title, new.body);
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS api_searchdocument_ad AFTER DELETE ON api_searchdocument BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, body) VALUES ('delete', old.id, old.title, old.body);
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS api_searchdocument_au AFTER UPDATE ON api_searchdocument BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, body) VALUES ('delete', old.id, old.title, old.body);
+            INSERT INTO {FTS_TABLE}(rowid, title, body) VALUES (new.id, new.title, new.body);
+        END""",
+    ],
+    # 'simple' configuration: content is mostly Polish, which PostgreSQL has no stemmer for by default
+    "postgresql": [
+        """ALTER TABLE api_searchdocument ADD COLUMN IF NOT EXISTS search_vector tsvector
+            GENERATED ALWAYS AS (
+                setweight(to_tsvector('simple', coalesce(title, '')), 'A') ||
+                setweight(to_tsvector('simple', coalesce(body, '')), 'B')
+            ) STORED""",
+        "CREATE INDEX IF NOT EXISTS api_searchdocument_vector_idx ON api_searchdocument USING GIN (search_vector)",
+    ],
+}
+
+DROP_SQL = {
+    "sqlite": [
+        "DROP TRIGGER IF EXISTS api_searchdocument_au",
+        "DROP TRIGGER IF EXISTS api_searchdocument_ad",
+        "DROP TRIGGER IF EXISTS api_searchdocument_ai",
+        f"DROP TABLE IF EXISTS {FTS_TABLE}",
+    ],
+    "postgresql": [
+        "DROP INDEX IF EXISTS api_searchdocument_vector_idx",
+        "ALTER TABLE api_searchdocument DROP COLUMN IF EXISTS search_vector",
+    ],
+}
+
+
+def add_text_index(apps, schema_editor):
+    for sql in INDEX_SQL.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+def remove_text_index(apps, schema_editor):
+    for sql in DROP_SQL.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+def populate_search_documents(apps, schema_editor):
+    Entry = apps.get_model("api", "Entry")
+    Request = apps.get_model("api", "Request")
+    SearchDocument = apps.get_model("api", "SearchDocument")
+    db_alias = schema_editor.connection.alias
+
+    documents = [
+        SearchDocument(kind="entry", object_id=entry.pk, title=entry.title, body=entry.content,
+                       is_truthful=entry.is_truthful)
+        for entry in Entry.objects.using(db_alias)
+    ] + [
+        SearchDocument(kind="request", object_id=request.pk, title=request.title, body=request.content)
+        for request in Request.objects.using(db_alias).filter(entry_id__isnull=True)
+    ]
+    SearchDocument.objects.using(db_alias).bulk_create(documents, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_unassigned_request_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('entry', 'Entry'), ('request', 'Request')], max_length=10)),
+                ('object_id', models.PositiveBigIntegerField()),
+                ('title', models.CharField(max_length=200)),
+                ('body', models.TextField(blank=True)),
+                ('is_truthful', models.BooleanField(blank=True, null=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('kind', 'object_id'), name='unique_search_document')],
+            },
+        ),
+        migrations.RunPython(add_text_index, remove_text_index),
+        migrations.RunPython(populate_search_documents, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 6.0 on 2026-10-18 09:46
+
+import api.models
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScanRendition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('thumbnail', 'Thumbnail'), ('web', 'Web')], max_length=20)),
+                ('file', models.FileField(upload_to=api.models.get_rendition_path)),
+                ('width', models.PositiveIntegerField(default=0)),
+                ('height', models.PositiveIntegerField(default=0)),
+                ('size', models.PositiveIntegerField(default=0)),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='renditions', to='api.applicationdocument')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('document', 'kind'), name='unique_scan_rendition')],
+            },
+        ),
+    ]
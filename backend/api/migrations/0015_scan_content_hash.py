@@ -0,0 +1,23 @@
+# Generated by Django 6.0 on 2026-10-18 09:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_scanrendition'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='applicationdocument',
+            name='sha256',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='applicationdocument',
+            name='size',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
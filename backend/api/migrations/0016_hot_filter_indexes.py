@@ -0,0 +1,41 @@
+# Generated by Django 6.0 on 2026-10-18 14:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_scan_content_hash'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='request',
+            name='entry_id',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, to='api.entry'),
+        ),
+        migrations.AddIndex(
+            model_name='application',
+            index=models.Index(fields=['author', 'is_accepted'], name='application_author_state_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='entry',
+            index=models.Index(condition=models.Q(('is_truthful', False)), fields=['id'], name='entry_untruthful_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='request',
+            index=models.Index(condition=models.Q(('entry_id__isnull', True)), fields=['created_at', 'id'], name='request_open_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='request',
+            index=models.Index(condition=models.Q(('entry_id__isnull', False)), fields=['created_at', 'id'], name='request_closed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='request',
+            index=models.Index(condition=models.Q(('entry_id__isnull', False)), fields=['entry_id'], name='request_entry_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 6.0 on 2026-10-18 10:40
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0016_hot_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SharedFile',
+            fields=[
+                ('name', models.CharField(max_length=255, primary_key=True, serialize=False)),
+                ('locked_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 6.0 on 2026-10-18 11:40
+
+from django.db import migrations
+from django.db.models import Count, Min
+
+
+def merge_duplicate_tags(apps, schema_editor):
+    """Folds tags sharing a name into the oldest one, so the unique constraint can be added."""
+    Tag = apps.get_model("api", "Tag")
+    db_alias = schema_editor.connection.alias
+    assignments = [
+        (apps.get_model("api", "RedactorTagAssignment"), "redactor_id"),
+        (apps.get_model("api", "EntryTagAssignment"), "entry_id"),
+        (apps.get_model("api", "RequestTagAssignment"), "request_id"),
+    ]
+
+    duplicates = (Tag.objects.using(db_alias).values("name").annotate(n=Count("pk"), kept=Min("pk"))
+                  .filter(n__gt=1).values_list("name", "kept"))
+    for name, kept in duplicates:
+        merged = list(Tag.objects.using(db_alias).filter(name=name).exclude(pk=kept).values_list("pk", flat=True))
+        for tag_id in merged:
+            for model, owner in assignments:
+                rows = model.objects.using(db_alias)
+                # owners that already have the kept tag would end up with it twice
+                has_kept = rows.filter(tag_id=kept).values(owner)
+                rows.filter(tag_id=tag_id, **{f"{owner}__in": has_kept}).delete()
+                rows.filter(tag_id=tag_id).update(tag_id=kept)
+        Tag.objects.using(db_alias).filter(pk__in=merged).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0019_entry_upvotes_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_tags, migrations.RunPython.noop),
+    ]
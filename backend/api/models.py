@@ -2,6 +2,7 @@ import os
 import uuid
 
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import User
 
 
@@ -22,7 +23,7 @@ class Profile(models.Model):
 
 
 class Tag(models.Model):
-    name = models.CharField(max_length=50)
+    name = models.CharField(max_length=50, unique=True)
 
     def __str__(self):
         return self.name
@@ -50,11 +51,35 @@ class Entry(models.Model):
     articles = models.JSONField(default=list, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     is_truthful = models.BooleanField()
+    upvotes_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["created_at", "id"], name="entry_created_id_idx"),
+            # the misleading-domain ranking is rebuilt from the entries marked as not truthful
+            models.Index(fields=["id"], condition=models.Q(is_truthful=False), name="entry_untruthful_idx"),
+            # the most upvoted entries, read backwards
+            models.Index(fields=["upvotes_count", "id"], name="entry_upvotes_idx"),
+        ]
 
     def __str__(self):
         return self.title
 
 
+class DomainCount(models.Model):
+    """Number of article links per domain across entries marked as not truthful."""
+    domain = models.CharField(max_length=255, unique=True)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["-count", "domain"], name="domaincount_count_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.domain} ({self.count})"
+
+
 class EntryTagAssignment(models.Model):
     entry = models.ForeignKey(Entry, on_delete=models.CASCADE, related_name="assigned_tags")
     tag = models.ForeignKey(Tag, on_delete=models.CASCADE, related_name="assigned_entries")
@@ -97,6 +122,12 @@ class Application(models.Model):
     is_accepted = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["created_at", "id"], name="application_created_id_idx"),
+            models.Index(fields=["author", "is_accepted"], name="application_author_state_idx"),
+        ]
+
     def __str__(self):
         return f"Application {self.id} from {self.author}"
 
@@ -104,7 +135,10 @@ class Application(models.Model):
 class ApplicationDocument(models.Model):
     application = models.ForeignKey(Application, on_delete=models.CASCADE, related_name='scans')
 
+    # content addressed, see api/uploads.py; documents with the same bytes share one file
     image = models.ImageField(upload_to=get_file_path)
+    sha256 = models.CharField(max_length=64, blank=True, db_index=True)
+    size = models.PositiveBigIntegerField(default=0)
 
     uploaded_at = models.DateTimeField(auto_now_add=True)
 
@@ -112,16 +146,87 @@ class ApplicationDocument(models.Model):
     def __str__(self):
         return f"Scan from application {self.application.id}"
 
+class ThrottleCounter(models.Model):
+    """Requests counted towards a rate limit in its current window, see api/throttling.py."""
+    key = models.CharField(max_length=255, primary_key=True)
+    window_end = models.BigIntegerField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [models.Index(fields=["window_end"], name="throttle_window_end_idx")]
+
+    def __str__(self):
+        return f"{self.key}: {self.count}"
+
+
+class SharedFile(models.Model):
+    """
+    One row per stored file that several rows may point to (scans and their renditions).
+    Storing such a file and deleting it after its last reference both write this row first,
+    so they wait for each other instead of interleaving (see api/uploads.py).
+    """
+    name = models.CharField(max_length=255, primary_key=True)
+    locked_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return self.name
+
+
+def get_rendition_path(instance, filename):
+    ext = filename.split('.')[-1]
+    filename = f"{uuid.uuid4()}_{instance.kind}.{ext}"
+    return os.path.join('application_scans', 'renditions', filename)
+
+
+class RenditionKind(models.TextChoices):
+    THUMBNAIL = 'thumbnail', 'Thumbnail'
+    WEB = 'web', 'Web'
+
+
+class ScanRendition(models.Model):
+    """A downscaled, recompressed copy of a scan, made in the background (see api/imaging.py)."""
+    document = models.ForeignKey(ApplicationDocument, on_delete=models.CASCADE, related_name='renditions')
+    kind = models.CharField(max_length=20, choices=RenditionKind.choices)
+    file = models.FileField(upload_to=get_rendition_path)
+    width = models.PositiveIntegerField(default=0)
+    height = models.PositiveIntegerField(default=0)
+    size = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["document", "kind"],
+                name="unique_scan_rendition"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.kind} of scan {self.document_id}"
+
+
 class Request(models.Model):
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name="submitted_requests")
     title = models.CharField(max_length=200)
     content = models.TextField(blank=True)
     articles = models.JSONField(null=False, blank=False)
     redactor = models.ForeignKey(User, blank=True, null=True, on_delete=models.CASCADE, related_name="assigned_requests")
-    entry_id = models.ForeignKey(Entry, blank=True, null=True, on_delete=models.CASCADE)
+    # indexed below, only where set: open requests are found through request_open_idx
+    entry_id = models.ForeignKey(Entry, blank=True, null=True, on_delete=models.CASCADE, db_index=False)
     created_at = models.DateTimeField(auto_now_add=True)
     closed_at = models.DateTimeField(blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["created_at", "id"], name="request_created_id_idx"),
+            models.Index(fields=["created_at", "id"], condition=models.Q(redactor__isnull=True),
+                         name="request_unassigned_idx"),
+            models.Index(fields=["created_at", "id"], condition=models.Q(entry_id__isnull=True),
+                         name="request_open_idx"),
+            models.Index(fields=["created_at", "id"], condition=models.Q(entry_id__isnull=False),
+                         name="request_closed_idx"),
+            models.Index(fields=["entry_id"], condition=models.Q(entry_id__isnull=False), name="request_entry_idx"),
+        ]
+
     def __str__(self):
         return self.title
 
@@ -135,4 +240,74 @@ class RequestTagAssignment(models.Model):
                 fields=["request", "tag"],
                 name="unique_request_tag_assignment"
             )
-        ]
\ No newline at end of file
+        ]
+        indexes = [
+            models.Index(fields=["tag", "request"], name="requesttag_tag_request_idx"),
+        ]
+
+class SearchKind(models.TextChoices):
+    ENTRY = 'entry', 'Entry'
+    REQUEST = 'request', 'Request'
+
+
+class SearchDocument(models.Model):
+    """
+    Searchable text of an entry or a pending request. The text index over this table is
+    vendor specific (FTS5 on SQLite, tsvector/GIN on PostgreSQL), see api/search.py.
+    """
+    kind = models.CharField(max_length=10, choices=SearchKind.choices)
+    object_id = models.PositiveBigIntegerField()
+    title = models.CharField(max_length=200)
+    body = models.TextField(blank=True)
+    is_truthful = models.BooleanField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["kind", "object_id"],
+                name="unique_search_document"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.object_id}"
+
+
+class JobStatus(models.TextChoices):
+    QUEUED = 'queued', 'Queued'
+    RUNNING = 'running', 'Running'
+    DONE = 'done', 'Done'
+    FAILED = 'failed', 'Failed'
+
+
+class Job(models.Model):
+    """Background work picked up by `manage.py runworker`, see api/jobs.py."""
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=JobStatus.choices, default=JobStatus.QUEUED)
+    # at most one queued job per key; once a job runs, a new one may be queued behind it
+    dedupe_key = models.CharField(max_length=200, blank=True, null=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["dedupe_key"],
+                condition=models.Q(status="queued"),
+                name="unique_queued_job"
+            )
+        ]
+        indexes = [
+            models.Index(fields=["run_at", "id"], condition=models.Q(status="queued"), name="job_queued_idx"),
+            models.Index(fields=["status", "name"], name="job_status_name_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.id} ({self.status})"
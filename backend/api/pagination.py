@@ -0,0 +1,27 @@
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class CreatedAtCursorPagination(CursorPagination):
+    """
+    Opaque-cursor pagination over (created_at, id), newest first.
+    Each page is an index range scan, so deep pages cost the same as the first one.
+    """
+    ordering = ("-created_at", "-id")
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 100
+
+
+class DateJoinedCursorPagination(CreatedAtCursorPagination):
+    ordering = ("-date_joined", "-id")
+
+
+class OldestFirstCursorPagination(CreatedAtCursorPagination):
+    ordering = ("created_at", "id")
+
+
+class SearchPagination(PageNumberPagination):
+    # results are ordered by relevance, which has no stable key to build a cursor on
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 100
@@ -1,4 +1,5 @@
 from rest_framework import permissions
+from .auth import get_principal
 from .models import Application
 
 
@@ -31,8 +32,7 @@ class IsRedactor(permissions.BasePermission):
         if not request.user or not request.user.is_authenticated:
             return False
 
-        profile = getattr(request.user, "profile", None)
-        return bool(profile and profile.user_type == "redactor")
+        return get_principal(request.user).is_redactor
 
     def has_object_permission(self, request, view, obj):
         return self.has_permission(request, view)
@@ -49,8 +49,7 @@ class IsRedactorOrReadOnlyObject(permissions.BasePermission):
         if not user.is_authenticated:
             return False
 
-        profile = getattr(user, "profile", None)
-        return profile and profile.user_type == 'redactor'
+        return get_principal(user).is_redactor
 
     def has_object_permission(self, request, view, obj):
             if request.method in permissions.SAFE_METHODS:
@@ -60,8 +59,7 @@ class IsRedactorOrReadOnlyObject(permissions.BasePermission):
             if not user.is_authenticated:
                 return False
 
-            profile = getattr(user, "profile", None)
-            return (profile and profile.user_type == 'redactor') and obj.author==request.user
+            return get_principal(user).is_redactor and obj.author_id == user.id
 
 class IsAuthor(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
@@ -84,10 +82,8 @@ class IsRedactorOrAdmin(permissions.BasePermission):
     def has_permission(self, request, view):
         if not request.user or not request.user.is_authenticated:
             return False
-        if request.user.is_staff:
-            return True
-        profile = getattr(request.user, "profile", None)
-        return bool(profile and profile.user_type == "redactor")
+        principal = get_principal(request.user)
+        return principal.is_staff or principal.is_redactor
 
     def has_object_permission(self, request, view, obj):
         return self.has_permission(request, view)
\ No newline at end of file
@@ -0,0 +1,79 @@
+from collections import Counter
+from urllib.parse import urlparse
+
+from django.db import transaction
+from django.db.models import F, Window
+from django.db.models.functions import DenseRank, Greatest
+
+from .models import DomainCount, Entry
+
+RANKING_SIZE = 25
+
+
+def extract_domain(link):
+    if not link:
+        return None
+    try:
+        if "://" not in link:
+            link = "http://" + link
+        domain = urlparse(link).netloc.lower()
+    except Exception:
+        return None
+
+    if domain.startswith('www.'):
+        domain = domain[4:]
+    return domain or None
+
+
+def count_domains(is_truthful, articles):
+    """Domain occurrences an entry contributes to the ranking (nothing for truthful entries)."""
+    domains = Counter()
+    if is_truthful:
+        return domains
+    for link in articles or []:
+        domain = extract_domain(link)
+        if domain:
+            domains[domain] += 1
+    return domains
+
+
+def domain_delta(old, new):
+    return {domain: new[domain] - old[domain] for domain in old.keys() | new.keys()}
+
+
+def apply_domain_delta(delta):
+    """Add (or subtract, for negative values) per-domain counts in place."""
+    delta = {domain: n for domain, n in delta.items() if n}
+    if not delta:
+        return
+
+    with transaction.atomic():
+        for domain, n in delta.items():
+            # clamped, so a count that drifted below what is subtracted can't fail the entry's write
+            updated = DomainCount.objects.filter(domain=domain).update(count=Greatest(F("count") + n, 0))
+            if not updated and n > 0:
+                row, created = DomainCount.objects.get_or_create(domain=domain, defaults={"count": n})
+                if not created:
+                    DomainCount.objects.filter(pk=row.pk).update(count=F("count") + n)
+        DomainCount.objects.filter(domain__in=delta.keys(), count__lte=0).delete()
+
+
+def rebuild_domain_counts():
+    domains = Counter()
+    for articles in Entry.objects.filter(is_truthful=False).values_list("articles", flat=True).iterator(chunk_size=2000):
+        domains.update(count_domains(False, articles))
+
+    with transaction.atomic():
+        DomainCount.objects.all().delete()
+        DomainCount.objects.bulk_create(
+            [DomainCount(domain=domain, count=count) for domain, count in domains.items()],
+            batch_size=1000,
+        )
+    return len(domains)
+
+
+def ranked_domains(limit=RANKING_SIZE):
+    """Domains in the first `limit` dense ranks, ranked by the database."""
+    return DomainCount.objects.filter(count__gt=0).annotate(
+        rank=Window(expression=DenseRank(), order_by=F("count").desc())
+    ).filter(rank__lte=limit).order_by("-count", "domain").values("rank", "domain", "count")
@@ -0,0 +1,211 @@
+"""
+Read replicas. Every URL in DATABASE_REPLICA_URLS becomes a database alias (see settings); the
+public read handlers decorated with read_from_replica send their queries to one of them and
+everything else uses the primary. A user who changed something reads from the primary for
+REPLICA_PIN_SECONDS afterwards, so they see their own writes, and replicas that are down or
+further behind than REPLICA_MAX_LAG_SECONDS are skipped until they are checked again.
+"""
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.utils.functional import SimpleLazyObject, empty
+from rest_framework.permissions import SAFE_METHODS
+
+from .metrics import REPLICA_FALLBACKS
+
+PIN_KEY = "replica-pin:{}"
+
+# seconds the replica is behind; 0 when it has replayed everything it received, as
+# pg_last_xact_replay_timestamp() stays put while the primary is idle, but NULL (unknown) when
+# it isn't receiving anything, as then it can't tell what it missed. The status of the WAL
+# receiver is only shown to roles with pg_read_all_stats, others see NULL there.
+LAG_SQL = {
+    "postgresql": """
+        SELECT CASE WHEN NOT pg_is_in_recovery() THEN 0
+                    WHEN NOT EXISTS (SELECT FROM pg_stat_wal_receiver WHERE coalesce(status, 'streaming') = 'streaming')
+                        THEN NULL
+                    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                    ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END
+    """,
+}
+
+_replica = ContextVar("replica", default=None)
+
+
+def _measure_lag(alias):
+    """Replication lag in seconds (infinite when unknown), or None when the replica can't be reached."""
+    connection = connections[alias]
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(LAG_SQL.get(connection.vendor, "SELECT 0"))
+            lag = cursor.fetchone()[0]
+            return float("inf") if lag is None else float(lag)
+    except DatabaseError:
+        try:
+            connection.close()
+        except DatabaseError:
+            pass
+        return None
+
+
+class ReplicaHealth:
+    """The last measured lag of each replica in this process, measured again every REPLICA_CHECK_SECONDS."""
+
+    def __init__(self):
+        self._locks = {}  # alias -> lock held while measuring it
+        self._checked = {}  # alias -> (monotonic time, lag or None)
+
+    def _lock(self, alias):
+        return self._locks.setdefault(alias, threading.Lock())
+
+    def lag(self, alias):
+        checked = self._checked.get(alias)
+        if checked is None or time.monotonic() - checked[0] >= settings.REPLICA_CHECK_SECONDS:
+            # one thread measures each replica, the others keep using the previous result meanwhile;
+            # a replica that doesn't answer holds up its first readers for REPLICA_CONNECT_TIMEOUT at most
+            lock = self._lock(alias)
+            if lock.acquire(blocking=checked is None):
+                try:
+                    checked = self._checked[alias] = (time.monotonic(), _measure_lag(alias))
+                finally:
+                    lock.release()
+        return checked[1]
+
+    def reset(self):
+        self._checked.clear()
+
+
+replica_health = ReplicaHealth()
+
+
+def pin_to_primary(user):
+    cache.set(PIN_KEY.format(user.pk), True, settings.REPLICA_PIN_SECONDS)
+
+
+async def apin_to_primary(user):
+    await cache.aset(PIN_KEY.format(user.pk), True, settings.REPLICA_PIN_SECONDS)
+
+
+def choose_replica(user=None):
+    """A replica that is up and close enough to the primary, or None when `user` has to read from the primary."""
+    if not settings.DATABASE_REPLICAS:
+        return None
+    if user is not None and user.is_authenticated and cache.get(PIN_KEY.format(user.pk)):
+        return None
+
+    for alias in random.sample(settings.DATABASE_REPLICAS, len(settings.DATABASE_REPLICAS)):
+        lag = replica_health.lag(alias)
+        if lag is None:
+            REPLICA_FALLBACKS.labels(alias, "unavailable").inc()
+        elif lag > settings.REPLICA_MAX_LAG_SECONDS:
+            REPLICA_FALLBACKS.labels(alias, "lagging").inc()
+        else:
+            return alias
+    return None
+
+
+@contextmanager
+def reading_from(alias):
+    """Routes the reads in the block to `alias`; None keeps them on the primary."""
+    token = _replica.set(alias)
+    try:
+        yield
+    finally:
+        _replica.reset(token)
+
+
+def read_from_replica(handler):
+    """
+    Runs a read-only view handler against a replica picked for the requesting user. Below
+    cache_anonymous_response, so cached responses don't pick one at all.
+    """
+    if iscoroutinefunction(handler):
+        @wraps(handler)
+        async def async_wrapper(view, request, *args, **kwargs):
+            if not settings.DATABASE_REPLICAS:
+                return await handler(view, request, *args, **kwargs)
+            alias = await sync_to_async(choose_replica)(request.user)
+            with reading_from(alias):
+                return await handler(view, request, *args, **kwargs)
+        return async_wrapper
+
+    @wraps(handler)
+    def wrapper(view, request, *args, **kwargs):
+        with reading_from(choose_replica(request.user)):
+            return handler(view, request, *args, **kwargs)
+    return wrapper
+
+
+class ReplicaRouter:
+    """Reads go where read_from_replica sent them, writes always go to the primary."""
+
+    def db_for_read(self, model, **hints):
+        return _replica.get() or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        # also for objects that were read from a replica
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # replicas get the schema from the primary
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
+
+
+def _authenticated_user(request):
+    user = getattr(request, "user", None)
+    if isinstance(user, SimpleLazyObject) and user._wrapped is empty:
+        # nothing authenticated the request
+        return None
+    return user if user is not None and user.is_authenticated else None
+
+
+class ReadYourWritesMiddleware:
+    """
+    Pins the user to the primary for REPLICA_PIN_SECONDS after every successful request of theirs
+    that may have written, in the shared cache so every worker knows. Does nothing without replicas.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def _wrote(self, request, response):
+        if not settings.DATABASE_REPLICAS or request.method in SAFE_METHODS or response.status_code >= 400:
+            return None
+        return _authenticated_user(request)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        response = self.get_response(request)
+        user = self._wrote(request, response)
+        if user is not None:
+            pin_to_primary(user)
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        user = self._wrote(request, response)
+        if user is not None:
+            await apin_to_primary(user)
+        return response
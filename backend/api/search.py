@@ -0,0 +1,156 @@
+import re
+
+from django.db import connection
+
+from .models import SearchDocument, SearchKind, EntryTagAssignment, RequestTagAssignment
+
+# created by migration 0012: an FTS5 table kept up to date by triggers on SQLite, a generated
+# search_vector column with a GIN index on PostgreSQL
+FTS_TABLE = "api_searchdocument_fts"
+
+
+def rebuild_text_index():
+    """Re-reads every document into the text index (only needed on SQLite, PostgreSQL computes it per row)."""
+    if connection.vendor == "sqlite":
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def _upsert(documents):
+    SearchDocument.objects.bulk_create(
+        documents,
+        update_conflicts=True,
+        unique_fields=["kind", "object_id"],
+        update_fields=["title", "body", "is_truthful"],
+        batch_size=500,
+    )
+
+
+def index_entries(entries):
+    _upsert([
+        SearchDocument(kind=SearchKind.ENTRY, object_id=entry.pk, title=entry.title,
+                       body=entry.content, is_truthful=entry.is_truthful)
+        for entry in entries
+    ])
+
+
+def index_requests(requests):
+    """Pending requests are searchable; closed ones are dropped from the index."""
+    pending = [request for request in requests if request.entry_id_id is None]
+    closed = [request.pk for request in requests if request.entry_id_id is not None]
+
+    _upsert([
+        SearchDocument(kind=SearchKind.REQUEST, object_id=request.pk, title=request.title,
+                       body=request.content)
+        for request in pending
+    ])
+    if closed:
+        remove_documents(SearchKind.REQUEST, closed)
+
+
+def remove_documents(kind, object_ids):
+    SearchDocument.objects.filter(kind=kind, object_id__in=object_ids).delete()
+
+
+def _fts5_query(text):
+    """Turns free text into an FTS5 expression: every word must match, the last one as a prefix."""
+    terms = re.findall(r"\w+", text)
+    if not terms:
+        return None
+    quoted = ['"%s"' % term for term in terms]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+class SearchResults:
+    """
+    Lazily evaluated, ranked list of matching object ids. Supports count() and slicing,
+    so it can be handed straight to a Django/DRF paginator.
+    """
+
+    def __init__(self, text, kind, tag_id=None, is_truthful=None):
+        self.text = text
+        self.kind = kind
+        self.tag_id = tag_id
+        self.is_truthful = is_truthful
+        self._count = None
+
+    def _filters(self, alias):
+        conditions = [f"{alias}.kind = %s"]
+        params = [self.kind]
+        if self.is_truthful is not None and self.kind == SearchKind.ENTRY:
+            conditions.append(f"{alias}.is_truthful = %s")
+            params.append(self.is_truthful)
+        if self.tag_id is not None:
+            if self.kind == SearchKind.ENTRY:
+                table, column = EntryTagAssignment._meta.db_table, "entry_id"
+            else:
+                table, column = RequestTagAssignment._meta.db_table, "request_id"
+            conditions.append(f"{alias}.object_id IN (SELECT {column} FROM {table} WHERE tag_id = %s)")
+            params.append(self.tag_id)
+        return conditions, params
+
+    def _query(self, select, order_by=None, limit=None, offset=None):
+        conditions, params = self._filters("d")
+
+        if connection.vendor == "sqlite":
+            match = _fts5_query(self.text)
+            if match is None:
+                return None, None
+            sql = (f"SELECT {select.format(score=f'bm25({FTS_TABLE}, 10.0, 1.0)')} "
+                   f"FROM {FTS_TABLE} JOIN api_searchdocument d ON d.id = {FTS_TABLE}.rowid "
+                   f"WHERE {FTS_TABLE} MATCH %s AND " + " AND ".join(conditions))
+            params = [match] + params
+            order = "score ASC, d.id"
+        elif connection.vendor == "postgresql":
+            sql = (f"SELECT {select.format(score='ts_rank(d.search_vector, q)')} "
+                   f"FROM api_searchdocument d, websearch_to_tsquery('simple', %s) q "
+                   f"WHERE d.search_vector @@ q AND " + " AND ".join(conditions))
+            params = [self.text] + params
+            order = "score DESC, d.id"
+        else:
+            sql = (f"SELECT {select.format(score='0')} FROM api_searchdocument d "
+                   f"WHERE (d.title LIKE %s OR d.body LIKE %s) AND " + " AND ".join(conditions))
+            params = [f"%{self.text}%", f"%{self.text}%"] + params
+            order = "d.id DESC"
+
+        if order_by:
+            sql += f" ORDER BY {order}"
+        if limit is not None:
+            sql += " LIMIT %s OFFSET %s"
+            params += [limit, offset]
+        return sql, params
+
+    def count(self):
+        if self._count is None:
+            sql, params = self._query("COUNT(*)")
+            if sql is None:
+                self._count = 0
+            else:
+                with connection.cursor() as cursor:
+                    cursor.execute(sql, params)
+                    self._count = cursor.fetchone()[0]
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start = index.start or 0
+        stop = index.stop if index.stop is not None else self.count()
+        if stop <= start:
+            return []
+
+        sql, params = self._query("d.object_id, {score} AS score", order_by=True,
+                                  limit=stop - start, offset=start)
+        if sql is None:
+            return []
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return [row[0] for row in cursor.fetchall()]
+
+
+def search_documents(text, kind, tag_id=None, is_truthful=None):
+    return SearchResults(text, kind, tag_id=tag_id, is_truthful=is_truthful)
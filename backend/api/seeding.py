@@ -0,0 +1,194 @@
+import random
+from collections import Counter
+from dataclasses import dataclass, fields
+from datetime import timedelta
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .cache import bump_resources
+from .models import (AccountType, Entry, EntryTagAssignment, Profile, RedactorTagAssignment, Request,
+                     RequestTagAssignment, Tag, Upvote)
+from .ranking import rebuild_domain_counts
+from .search import index_entries, index_requests, rebuild_text_index
+
+SEED_PREFIX = "seed-"
+SEED_PASSWORD = "seed-password"
+BATCH_SIZE = 1000
+
+CATEGORIES = [
+    "Politics", "Health", "Science", "Economy", "Technology", "Climate", "Sport", "Culture",
+    "World", "Education", "Crime", "Energy", "Migration", "Food", "Transport", "Religion",
+    "History", "Space", "Finance", "Celebrities",
+]
+WORDS = (
+    "claim study vaccine election minister report photo video viral quote statistic border "
+    "bank climate record scientists leaked secret plan tax ban crisis million billion law "
+    "court police school water energy price war city government company market warning"
+).split()
+
+
+@dataclass
+class SeedScale:
+    """Row counts at scale 1; `scaled` multiplies everything but the tag counts."""
+    users: int = 1000
+    redactors: int = 50
+    tags: int = 20
+    tags_per_redactor: int = 3
+    entries: int = 5000
+    open_requests: int = 2000
+    articles_per_entry: int = 3
+    domains: int = 500
+    upvotes: int = 50000
+
+    FIXED = ("tags", "tags_per_redactor", "articles_per_entry")
+
+    def scaled(self, factor):
+        return SeedScale(**{
+            f.name: getattr(self, f.name) if f.name in self.FIXED else max(1, round(getattr(self, f.name) * factor))
+            for f in fields(self)
+        })
+
+
+def seed(scale, seed=0, days=365, batch_size=BATCH_SIZE):
+    """
+    Bulk inserts synthetic users, redactors with tag assignments, entries with their closed
+    requests, open requests and upvotes, all reproducible from `seed`. Seeded users are named
+    `seed-<n>` and log in with SEED_PASSWORD. Returns the number of rows created per model.
+    """
+    rng = random.Random(seed)
+    now = timezone.now()
+    created = Counter()
+
+    def moment():
+        return now - timedelta(seconds=rng.randrange(days * 86400))
+
+    with transaction.atomic():
+        tags = _seed_tags(scale.tags, created)
+
+        offset = User.objects.filter(username__startswith=SEED_PREFIX).count()
+        password = make_password(SEED_PASSWORD)
+        users = User.objects.bulk_create([
+            User(username=f"{SEED_PREFIX}{offset + i}", password=password, date_joined=moment())
+            for i in range(scale.users)
+        ], batch_size=batch_size)
+        created["user"] = len(users)
+
+        # bulk_create skips the signal that gives every user a profile
+        redactors = users[:scale.redactors]
+        Profile.objects.bulk_create([
+            Profile(user=user, user_type=AccountType.REDACTOR if i < len(redactors) else AccountType.STANDARD)
+            for i, user in enumerate(users)
+        ], batch_size=batch_size)
+        assignments = RedactorTagAssignment.objects.bulk_create([
+            RedactorTagAssignment(redactor=redactor, tag=tag)
+            for redactor in redactors
+            for tag in rng.sample(tags, min(scale.tags_per_redactor, len(tags)))
+        ], batch_size=batch_size)
+        created["redactor tag"] = len(assignments)
+
+        # a few domains carry most of the links, as on the real site
+        domains = [f"{rng.choice(WORDS)}-{i}.example" for i in range(scale.domains)]
+        domain_weights = list(accumulate(1 / (rank + 1) for rank in range(len(domains))))
+
+        entry_tags, entries, closed_requests = [], [], []
+        for i in range(scale.entries):
+            redactor = rng.choice(redactors)
+            created_at = moment()
+            articles = [
+                f"https://{domain}/{rng.choice(WORDS)}-{rng.randrange(10 ** 6)}"
+                for domain in rng.choices(domains, cum_weights=domain_weights, k=rng.randint(1, scale.articles_per_entry))
+            ]
+            entry = Entry(author=redactor, title=_title(rng), content=_text(rng, 60), articles=articles,
+                          sources=[f"https://source-{rng.randrange(100)}.example/{i}"],
+                          is_truthful=rng.random() < 0.6, created_at=created_at)
+            entries.append(entry)
+            entry_tags.append(rng.sample(tags, rng.randint(1, 2)))
+            closed_requests.append(Request(
+                author=rng.choice(users), title=entry.title, content=_text(rng, 30), articles=articles,
+                redactor=redactor, created_at=created_at - timedelta(hours=rng.randint(1, 72)),
+                closed_at=created_at,
+            ))
+
+        entries = _insert(Entry, entries, batch_size)
+        for entry, request in zip(entries, closed_requests):
+            request.entry_id = entry
+        open_requests = [
+            Request(author=rng.choice(users), title=_title(rng), content=_text(rng, 30),
+                    articles=[f"https://{rng.choice(domains)}/{rng.randrange(10 ** 6)}"],
+                    redactor=rng.choice(redactors) if rng.random() < 0.3 else None, created_at=moment())
+            for _ in range(scale.open_requests)
+        ]
+        request_tags = entry_tags + [rng.sample(tags, rng.randint(1, 2)) for _ in open_requests]
+        requests = _insert(Request, closed_requests + open_requests, batch_size)
+        created["entry"], created["request"] = len(entries), len(requests)
+
+        EntryTagAssignment.objects.bulk_create([
+            EntryTagAssignment(entry=entry, tag=tag) for entry, chosen in zip(entries, entry_tags) for tag in chosen
+        ], batch_size=batch_size)
+        RequestTagAssignment.objects.bulk_create([
+            RequestTagAssignment(request=request, tag=tag) for request, chosen in zip(requests, request_tags) for tag in chosen
+        ], batch_size=batch_size)
+
+        # popular entries collect most of the votes; a user votes for an entry once
+        count = min(scale.upvotes, len(users) * len(entries))
+        voters = rng.choices(users, k=count)
+        voted = rng.choices(entries, weights=[rng.paretovariate(1.2) for _ in entries], k=count)
+        votes = {(user.pk, entry.pk) for user, entry in zip(voters, voted)}
+        Upvote.objects.bulk_create([Upvote(user_id=user_id, entry_id=entry_id) for user_id, entry_id in votes],
+                                   batch_size=batch_size, ignore_conflicts=True)
+        created["upvote"] = len(votes)
+
+        # bulk_create skips the signals, so the derived data is rebuilt in one go
+        Entry.objects.filter(author__username__startswith=SEED_PREFIX).update(upvotes_count=Coalesce(Subquery(
+            Upvote.objects.filter(entry=OuterRef("pk")).values("entry").annotate(n=Count("pk")).values("n")
+        ), 0))
+        for start in range(0, len(entries), batch_size):
+            index_entries(entries[start:start + batch_size])
+        for start in range(0, len(open_requests), batch_size):
+            index_requests(open_requests[start:start + batch_size])
+        rebuild_text_index()
+        rebuild_domain_counts()
+        bump_resources("entries", "ranking", "tags")
+
+    return +created
+
+
+def clear_seeded():
+    """Deletes the seeded users and, by cascade, everything they wrote or voted on."""
+    with transaction.atomic():
+        deleted, _ = User.objects.filter(username__startswith=SEED_PREFIX).delete()
+        rebuild_domain_counts()
+        bump_resources("entries", "ranking", "tags")
+    return deleted
+
+
+def _seed_tags(count, created):
+    names = CATEGORIES[:count] + [f"Category {i}" for i in range(len(CATEGORIES), count)]
+    existing = {tag.name: tag for tag in Tag.objects.filter(name__in=names)}
+    new = Tag.objects.bulk_create([Tag(name=name) for name in names if name not in existing])
+    created["tag"] = len(new)
+    return list(existing.values()) + new
+
+
+def _insert(model, objects, batch_size):
+    # created_at is auto_now_add, so the spread-out timestamps are written afterwards
+    created_at = [obj.created_at for obj in objects]
+    objects = model.objects.bulk_create(objects, batch_size=batch_size)
+    for obj, value in zip(objects, created_at):
+        obj.created_at = value
+    model.objects.bulk_update(objects, ["created_at"], batch_size=batch_size)
+    return objects
+
+
+def _title(rng):
+    return " ".join(rng.choices(WORDS, k=rng.randint(4, 9))).capitalize()
+
+
+def _text(rng, words):
+    return " ".join(rng.choices(WORDS, k=rng.randint(words // 2, words))).capitalize() + "."
@@ -1,17 +1,40 @@
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import prefetch_related_objects
 from django.db.models.fields.files import ImageFieldFile
 from rest_framework import serializers
 from rest_framework.fields import ImageField
+from PIL import Image, UnidentifiedImageError
 
 from .models import Profile, Entry, Tag, EntryTagAssignment, Application, ApplicationDocument, Request, RequestTagAssignment
+from .metrics import ENTRIES_CREATED, count_on_commit
+from .search import index_requests
+from .tags import serialize_tags
+from .tasks import render_application_scans
+from .timing import TimedSerializerMixin
+from .uploads import store_scan
+from .votes import voted_entry_ids
 
+MAX_REQUESTS_PER_POST = 50
 
-class UserProfileSerializer(serializers.ModelSerializer):
+
+def check_tag_ids(tag_ids):
+    """Drops duplicates and rejects unknown ids, with one query for the whole list."""
+    tag_ids = list(dict.fromkeys(tag_ids))
+    known = set(Tag.objects.filter(id__in=tag_ids).values_list("id", flat=True))
+    unknown = [tag_id for tag_id in tag_ids if tag_id not in known]
+    if unknown:
+        raise serializers.ValidationError(f"Unknown tag ids: {', '.join(map(str, unknown))}.")
+    return tag_ids
+
+
+class UserProfileSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Profile
         fields = ['user_type']
 
-class UserRegisterSerializer(serializers.ModelSerializer):
+class UserRegisterSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['username', 'password']
@@ -26,12 +49,12 @@ class UserRegisterSerializer(serializers.ModelSerializer):
         )
         return user
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Tag
         fields = ['id', 'name']
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     profile = UserProfileSerializer(read_only=True)
     assigned_tags_ids = serializers.SerializerMethodField()
     class Meta:
@@ -40,8 +63,7 @@ class UserSerializer(serializers.ModelSerializer):
 
     def get_assigned_tags_ids(self, obj):
         if obj.profile.user_type == 'redactor':
-            rows = obj.assigned_tags.all()
-            return TagSerializer([row.tag for row in rows], many=True).data
+            return serialize_tags(row.tag_id for row in obj.assigned_tags.all())
         return None
 
     def to_representation(self, instance):
@@ -50,12 +72,24 @@ class UserSerializer(serializers.ModelSerializer):
             ret.pop('assigned_tags_ids')
         return ret
 
-class EntrySerializer(serializers.ModelSerializer):
+class EntryListSerializer(TimedSerializerMixin, serializers.ListSerializer):
+    """
+    Looks up which entries of the page the current user voted on in one query,
+    so EntrySerializer.get_user_vote does not hit the database per row.
+    """
+
+    def to_representation(self, data):
+        entries = list(data.all() if hasattr(data, "all") else data)
+
+        if "voted_entry_ids" not in self.context:
+            request = self.context.get("request")
+            self.context["voted_entry_ids"] = voted_entry_ids(getattr(request, "user", None), entries)
+
+        return super().to_representation(entries)
+
+
+class EntrySerializer(TimedSerializerMixin, serializers.ModelSerializer):
 
-    upvotes_count = serializers.IntegerField(
-        source="upvoted.count",
-        read_only=True
-    )
     author = UserSerializer(read_only=True)
     tags = serializers.SerializerMethodField(read_only=True)
     tag_ids = serializers.ListField(child=serializers.IntegerField(), write_only=True)
@@ -66,44 +100,73 @@ class EntrySerializer(serializers.ModelSerializer):
         model = Entry
         fields = ['id', 'author', 'title','is_truthful', 'content','sources', 'articles',
                   'tags', 'tag_ids', 'request_id', 'upvotes_count', 'user_vote', 'created_at']
+        read_only_fields = ['upvotes_count']
+        list_serializer_class = EntryListSerializer
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        # everything the serializer reads per row, fetched in a fixed number of queries
+        return queryset.select_related(
+            "author__profile"
+        ).prefetch_related(
+            # tag names come from the catalogue in api/tags.py
+            "assigned_tags",
+            "author__assigned_tags",
+        )
+
+    def validate_tag_ids(self, tag_ids):
+        return check_tag_ids(tag_ids)
 
     def create(self, validated_data):
-        # if not Request.objects.filter(id=request_id).exists():
-        #     raise serializers.ValidationError("Request with this id does not exist")
         request_id = validated_data.pop("request_id")
-        request = Request.objects.get(id=request_id)
-
         tag_ids = validated_data.pop("tag_ids", [])
 
-        req = self.context.get("request")
-
-        entry = Entry.objects.create(
-            **validated_data
-        )
+        with transaction.atomic():
+            # locked so two redactors cannot close the same request at once
+            request = Request.objects.select_for_update().filter(id=request_id).first()
+            if request is None:
+                raise serializers.ValidationError({"request_id": "Request with this id does not exist."})
+            if request.entry_id_id is not None:
+                raise serializers.ValidationError({"request_id": "This request is already closed."})
 
-        request.entry_id = entry
-        request.closed_at = entry.created_at
-        request.save()
+            validated_data["articles"] = list(dict.fromkeys(request.articles + validated_data.get("articles", [])))
+            entry = Entry.objects.create(**validated_data)
 
-        entry.articles = set(request.articles + entry.articles)
+            request.entry_id = entry
+            request.closed_at = entry.created_at
+            request.save(update_fields=["entry_id", "closed_at"])
 
-        for tag_id in tag_ids:
-            tag = Tag.objects.get(id=tag_id)
-            EntryTagAssignment.objects.create(entry=entry, tag=tag)
+            EntryTagAssignment.objects.bulk_create(
+                [EntryTagAssignment(entry=entry, tag_id=tag_id) for tag_id in tag_ids]
+            )
+            count_on_commit(ENTRIES_CREATED)
 
         return entry
 
     def get_tags(self, obj):
-        rows = obj.assigned_tags.all()
-        return TagSerializer([row.tag for row in rows], many=True).data
+        return serialize_tags(row.tag_id for row in obj.assigned_tags.all())
+
+    @staticmethod
+    def rendered_tag_ids(entries):
+        """The ids of every tag rendered for `entries` (set up with setup_eager_loading)."""
+        return {
+            row.tag_id
+            for entry in entries
+            for rows in (entry.assigned_tags.all(), entry.author.assigned_tags.all())
+            for row in rows
+        }
 
     def get_user_vote(self, obj):
+        voted_entry_ids = self.context.get("voted_entry_ids")
+        if voted_entry_ids is not None:
+            return obj.id in voted_entry_ids
+
         user = self.context.get('request').user
         if user.is_authenticated:
             return obj.upvoted.filter(user=user).exists()
         return False
     
-class CurrentUserSerializer(serializers.ModelSerializer):
+class CurrentUserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     profile = UserProfileSerializer(read_only=True)
     is_superuser = serializers.BooleanField(read_only=True)
 
@@ -111,27 +174,41 @@ class CurrentUserSerializer(serializers.ModelSerializer):
         model = User
         fields = ["id", "username", "profile", "is_superuser"]
 
-class ApplicationDocumentSerializer(serializers.ModelSerializer):
+class ApplicationDocumentSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    renditions = serializers.SerializerMethodField()
 
     class Meta:
         model = ApplicationDocument
-        fields = ['id', 'image', 'uploaded_at']
+        fields = ['id', 'image', 'renditions', 'uploaded_at']
 
-class ApplicationListSerializer(serializers.ModelSerializer):
+    def get_renditions(self, obj):
+        """Thumbnail and web copies by kind; empty until the worker has made them."""
+        request = self.context.get('request')
+        renditions = {}
+        for rendition in obj.renditions.all():
+            url = rendition.file.url
+            renditions[rendition.kind] = {
+                'url': request.build_absolute_uri(url) if request else url,
+                'width': rendition.width,
+                'height': rendition.height,
+                'size': rendition.size,
+            }
+        return renditions
+
+class ApplicationListSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     author = UserSerializer(read_only=True)
     
     class Meta:
         model = Application
         fields = ['id', 'author', 'title', 'tags', 'is_accepted', 'created_at']
 
-class ApplicationDetailSerializer(serializers.ModelSerializer):
+class ApplicationDetailSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     author = UserSerializer(read_only=True)
     uploaded_scans = ApplicationDocumentSerializer(source='scans', many=True, read_only=True)
     tags = serializers.SerializerMethodField(read_only=True)
 
     def get_tags(self, obj):
-        tags = Tag.objects.filter(id__in=obj.tags)
-        return TagSerializer(tags, many=True).data
+        return serialize_tags(int(tag_id) for tag_id in obj.tags if str(tag_id).isdigit())
     class Meta:
         model = Application
         fields = [
@@ -139,11 +216,36 @@ class ApplicationDetailSerializer(serializers.ModelSerializer):
             'is_accepted', 'created_at', 'uploaded_scans'
         ]
 
-class ApplicationCreateSerializer(serializers.ModelSerializer):
+class ScanField(serializers.FileField):
+    """
+    Accepts common image formats after reading only the file header; the full decode
+    happens in the worker when the renditions are made.
+    """
+    formats = {"JPEG": "jpg", "PNG": "png", "WEBP": "webp", "GIF": "gif", "BMP": "bmp", "TIFF": "tiff"}
+    default_error_messages = {
+        "invalid_image": "Upload a valid image (JPEG, PNG, WebP, GIF, BMP or TIFF).",
+    }
+
+    def to_internal_value(self, data):
+        file = super().to_internal_value(data)
+        try:
+            with Image.open(file) as image:
+                image_format = image.format
+        except (UnidentifiedImageError, OSError):
+            self.fail("invalid_image")
+        if image_format not in self.formats:
+            self.fail("invalid_image")
+        file.seek(0)
+        file.extension = self.formats[image_format]
+        return file
+
+
+class ApplicationCreateSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     scans = serializers.ListField(
-        child=serializers.ImageField(),
+        child=ScanField(),
         write_only=True,
-        required=True
+        required=True,
+        max_length=settings.SCAN_MAX_FILES
     )
     uploaded_scans = ApplicationDocumentSerializer(source='scans', many=True, read_only=True)
     author = serializers.ReadOnlyField(source='author.username')
@@ -168,14 +270,42 @@ class ApplicationCreateSerializer(serializers.ModelSerializer):
         request = self.context.get('request')
         validated_data['author'] = request.user
 
-        application = Application.objects.create(**validated_data)
+        with transaction.atomic():
+            application = Application.objects.create(**validated_data)
 
-        for scan_image in scans_data:
-            ApplicationDocument.objects.create(application=application, image=scan_image)
+            for scan in scans_data:
+                name, digest = store_scan(scan, scan.extension)
+                ApplicationDocument.objects.create(application=application, image=name, sha256=digest, size=scan.size)
+
+            render_application_scans.enqueue(application_id=application.id, dedupe_key=f"scans:{application.id}")
 
         return application
 
-class RequestSerializer(serializers.ModelSerializer):
+class RequestListSerializer(TimedSerializerMixin, serializers.ListSerializer):
+    """Creates several requests (one POST with a JSON array) with one insert per table."""
+
+    def validate(self, attrs):
+        check_tag_ids([tag_id for item in attrs for tag_id in item["tag_ids"]])
+        return attrs
+
+    def create(self, validated_data):
+        tag_ids = [list(dict.fromkeys(item.pop("tag_ids", []))) for item in validated_data]
+
+        with transaction.atomic():
+            requests = Request.objects.bulk_create([Request(**item) for item in validated_data])
+            RequestTagAssignment.objects.bulk_create([
+                RequestTagAssignment(request=request, tag_id=tag_id)
+                for request, ids in zip(requests, tag_ids)
+                for tag_id in ids
+            ])
+            # bulk_create sends no post_save, so the search index is fed directly
+            index_requests(requests)
+
+        prefetch_related_objects(requests, "assigned_tags")
+        return requests
+
+
+class RequestSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     author = UserSerializer(read_only=True)
     tags = serializers.SerializerMethodField(read_only=True)
     tag_ids = serializers.ListField(child=serializers.IntegerField(), write_only=True)
@@ -185,22 +315,67 @@ class RequestSerializer(serializers.ModelSerializer):
         model = Request
         fields = ['id', 'author', 'title', 'content', 'articles',
                   'tags', 'tag_ids', 'redactor', 'entry_id', 'created_at', 'closed_at']
+        list_serializer_class = RequestListSerializer
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        return queryset.select_related(
+            "author__profile", "redactor__profile"
+        ).prefetch_related(
+            "assigned_tags",
+            "author__assigned_tags",
+            "redactor__assigned_tags",
+        )
 
     def get_tags(self, obj):
-        rows = obj.assigned_tags.all()
-        return TagSerializer([row.tag for row in rows], many=True).data
+        return serialize_tags(row.tag_id for row in obj.assigned_tags.all())
+
+    def validate_tag_ids(self, tag_ids):
+        # a list POST checks the tags of all items at once in RequestListSerializer.validate
+        if isinstance(self.parent, RequestListSerializer):
+            return tag_ids
+        return check_tag_ids(tag_ids)
 
     def create(self, validated_data):
         tag_ids = validated_data.pop("tag_ids", [])
 
-        req = self.context.get("request")
+        with transaction.atomic():
+            request = Request.objects.create(**validated_data)
+            RequestTagAssignment.objects.bulk_create(
+                [RequestTagAssignment(request=request, tag_id=tag_id) for tag_id in tag_ids]
+            )
 
-        request = Request.objects.create(
-            **validated_data
-        )
+        return request
 
-        for tag_id in tag_ids:
-            tag = Tag.objects.get(id=tag_id)
-            RequestTagAssignment.objects.create(request=request, tag=tag)
 
-        return request
+class ImportRecordSerializer(serializers.Serializer):
+    """Shape checks for one imported line; tags and authors are resolved by name per batch."""
+    title = serializers.CharField(max_length=200)
+    content = serializers.CharField(allow_blank=True, default="")
+    articles = serializers.ListField(child=serializers.CharField(), default=list)
+    tags = serializers.ListField(child=serializers.CharField(max_length=50), default=list)
+    author = serializers.CharField(required=False)
+    created_at = serializers.DateTimeField(required=False)
+
+
+class EntryImportSerializer(ImportRecordSerializer):
+    # accepts both the model field and the `verdict` column written by api/export.py
+    is_truthful = serializers.BooleanField(required=False)
+    verdict = serializers.ChoiceField(choices=["trustworthy", "not_trustworthy"], required=False)
+    sources = serializers.ListField(child=serializers.CharField())
+
+    def validate(self, attrs):
+        verdict = attrs.pop("verdict", None)
+        if "is_truthful" not in attrs:
+            if verdict is None:
+                raise serializers.ValidationError("Either is_truthful or verdict is required.")
+            attrs["is_truthful"] = verdict == "trustworthy"
+        return attrs
+
+
+class RequestImportSerializer(ImportRecordSerializer):
+    articles = serializers.ListField(child=serializers.CharField(), allow_empty=False)
+
+
+class TagImportSerializer(serializers.Serializer):
+    name = serializers.CharField(max_length=50)
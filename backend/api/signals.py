@@ -1,12 +1,142 @@
+from collections import Counter
+
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_save, pre_save, post_delete
 from django.dispatch import receiver
 
-from api.models import Profile
+from api.models import (Profile, Entry, Upvote, Request, SearchKind, Tag, EntryTagAssignment,
+                        RedactorTagAssignment, ScanRendition, ApplicationDocument)
+from api.ranking import count_domains, domain_delta, apply_domain_delta
+from api.search import index_entries, index_requests, remove_documents
+from api.auth import invalidate_claims
+from api.cache import bump_resources
+from api.uploads import release_file
 
 
 @receiver(post_save, sender=User)
 def create_or_update_user_profile(sender, instance, created, **kwargs):
     if created:
         Profile.objects.create(user=instance)
-    instance.profile.save()
\ No newline at end of file
+    instance.profile.save()
+
+
+@receiver(pre_save, sender=Entry)
+def remember_entry_domains(sender, instance, raw=False, **kwargs):
+    instance._ranked_domains = Counter()
+    if raw or instance.pk is None:
+        return
+    previous = Entry.objects.filter(pk=instance.pk).values("is_truthful", "articles").first()
+    if previous:
+        instance._ranked_domains = count_domains(previous["is_truthful"], previous["articles"])
+
+
+@receiver(post_save, sender=Entry)
+def update_domain_ranking(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    old = getattr(instance, "_ranked_domains", Counter())
+    new = count_domains(instance.is_truthful, instance.articles)
+    apply_domain_delta(domain_delta(old, new))
+    instance._ranked_domains = new
+
+
+@receiver(post_delete, sender=Entry)
+def remove_from_domain_ranking(sender, instance, **kwargs):
+    old = count_domains(instance.is_truthful, instance.articles)
+    apply_domain_delta({domain: -n for domain, n in old.items()})
+
+
+# EntryRateView keeps the counter in step itself; these cover every other path (admin, cascades, scripts)
+@receiver(post_save, sender=Upvote)
+def count_created_upvote(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        Entry.objects.filter(pk=instance.entry_id).update(upvotes_count=F("upvotes_count") + 1)
+
+
+@receiver(post_delete, sender=Upvote)
+def count_deleted_upvote(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, Entry) or getattr(origin, "model", None) is Entry:
+        return
+    Entry.objects.filter(pk=instance.entry_id).update(upvotes_count=F("upvotes_count") - 1)
+
+
+@receiver(post_save, sender=Entry)
+def index_entry(sender, instance, raw=False, **kwargs):
+    if not raw:
+        index_entries([instance])
+
+
+@receiver(post_delete, sender=Entry)
+def unindex_entry(sender, instance, **kwargs):
+    remove_documents(SearchKind.ENTRY, [instance.pk])
+
+
+@receiver(post_save, sender=Request)
+def index_request(sender, instance, raw=False, **kwargs):
+    if not raw:
+        index_requests([instance])
+
+
+@receiver(post_delete, sender=Request)
+def unindex_request(sender, instance, **kwargs):
+    remove_documents(SearchKind.REQUEST, [instance.pk])
+
+
+# role, staff flags and redactor tags are carried in JWT claims (api/auth.py)
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_claims(sender, instance, created=False, raw=False, **kwargs):
+    if not (created or raw):
+        invalidate_claims(instance.pk)
+
+
+@receiver(post_save, sender=Profile)
+@receiver(post_save, sender=RedactorTagAssignment)
+@receiver(post_delete, sender=RedactorTagAssignment)
+def invalidate_role_claims(sender, instance, created=False, raw=False, **kwargs):
+    if not raw:
+        invalidate_claims(instance.user_id if sender is Profile else instance.redactor_id)
+
+
+# scans and renditions are shared between documents with the same content; the file goes
+# with the last row, checked after commit so a rolled back delete keeps it
+@receiver(post_delete, sender=ApplicationDocument)
+def release_scan_file(sender, instance, **kwargs):
+    name = instance.image.name
+    transaction.on_commit(lambda: release_file(name, ApplicationDocument.objects.filter(image=name).exists))
+
+
+@receiver(post_delete, sender=ScanRendition)
+def release_rendition_file(sender, instance, **kwargs):
+    name = instance.file.name
+    transaction.on_commit(lambda: release_file(name, ScanRendition.objects.filter(file=name).exists))
+
+
+# Cached public responses (see api/cache.py) and the models they are built from.
+# Authors are embedded in entries, so user, profile and redactor tag changes count too.
+CACHED_RESOURCES = {
+    Entry: ("entries", "ranking"),
+    Upvote: ("entries",),
+    EntryTagAssignment: ("entries",),
+    Tag: ("tags", "entries"),
+    User: ("entries",),
+    Profile: ("entries",),
+    RedactorTagAssignment: ("entries",),
+}
+
+
+def _invalidate_on_change(resources):
+    def handler(sender, created=False, raw=False, **kwargs):
+        # a brand new user or profile is not referenced by any cached response yet
+        if raw or (created and sender in (User, Profile)):
+            return
+        bump_resources(*resources)
+    return handler
+
+
+for model, resources in CACHED_RESOURCES.items():
+    handler = _invalidate_on_change(resources)
+    post_save.connect(handler, sender=model, weak=False, dispatch_uid=f"cache-{model.__name__}-save")
+    post_delete.connect(handler, sender=model, weak=False, dispatch_uid=f"cache-{model.__name__}-delete")
@@ -0,0 +1,80 @@
+"""
+In-process catalogue of all tags (id -> name), so serializers render tags from the ids
+they already have instead of joining the tag table on every row.
+
+Each worker keeps its own copy and compares it with the "tags" version stamp in the shared
+cache (bumped on every tag change, see api/cache.py and api/signals.py) at most every
+TAG_CATALOGUE_RECHECK seconds, or at once when it meets an id it does not know.
+"""
+import asyncio
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+from .cache import resource_versions
+from .models import Tag
+
+_lock = threading.Lock()
+_catalogue = {"version": None, "names": {}, "checked_at": float("-inf")}
+
+
+def _refresh(force=False, recheck=False):
+    now = time.monotonic()
+    if not (force or recheck) and now - _catalogue["checked_at"] < settings.TAG_CATALOGUE_RECHECK:
+        return _catalogue["names"]
+    if _in_event_loop():
+        # no database access from async code; async views call aload_tag_names() first
+        return _catalogue["names"]
+
+    with _lock:
+        version = resource_versions(["tags"])[0]
+        if force or version != _catalogue["version"]:
+            # read after the version, so a change made meanwhile triggers another reload; from the
+            # primary, as a lagging replica would leave this version without the change
+            names = dict(Tag.objects.using(DEFAULT_DB_ALIAS).order_by("pk").values_list("pk", "name"))
+            _catalogue.update(version=version, names=names)
+        _catalogue["checked_at"] = now
+    return _catalogue["names"]
+
+
+def _in_event_loop():
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+def tag_names(recheck=False):
+    """
+    All tags as {id: name}, ordered by id. With recheck, the version stamp is compared now,
+    as needed when the result is cached under that version.
+    """
+    return _refresh(recheck=recheck)
+
+
+def _load(recheck, tag_ids):
+    names = _refresh(recheck=recheck)
+    if any(tag_id not in names for tag_id in tag_ids):
+        names = _refresh(force=True)
+    return names
+
+
+async def aload_tag_names(recheck=False, tag_ids=()):
+    """
+    Async views call this before serializing, as serialize_tags can't reload the catalogue from
+    the event loop; `tag_ids` are the ids about to be rendered, any unknown one reloads it now.
+    """
+    return await sync_to_async(_load)(recheck, set(tag_ids))
+
+
+def serialize_tags(tag_ids):
+    """The TagSerializer representation of the given tags, without touching the database."""
+    tag_ids = list(tag_ids)
+    names = _refresh()
+    if any(tag_id not in names for tag_id in tag_ids):
+        names = _refresh(force=True)
+    return [{"id": tag_id, "name": names[tag_id]} for tag_id in tag_ids if tag_id in names]
@@ -0,0 +1,103 @@
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+from .imaging import render_all
+from .jobs import job
+from .models import (AccountType, Application, ApplicationDocument, Profile, RedactorTagAssignment, ScanRendition,
+                     Tag)
+from .uploads import lock_file
+
+logger = logging.getLogger(__name__)
+
+_scan_pool = None
+
+
+def scan_pool():
+    """Process pool for decoding and resizing scans, started on first use by the worker."""
+    global _scan_pool
+    if _scan_pool is None:
+        _scan_pool = ProcessPoolExecutor(max_workers=settings.SCAN_RENDITION_WORKERS)
+    return _scan_pool
+
+
+@job("apply_role_change")
+def apply_role_change(user_id):
+    """
+    Brings applications and tag assignments in line with the user's current role.
+    Reads the role at run time, so a deduplicated job still applies the latest change.
+    """
+    profile = Profile.objects.select_related("user").filter(user_id=user_id).first()
+    if profile is None:
+        return
+    user = profile.user
+
+    with transaction.atomic():
+        if profile.user_type == AccountType.REDACTOR:
+            pending_app = Application.objects.filter(author=user, is_accepted=False).first()
+
+            if pending_app:
+                pending_app.is_accepted = True
+                pending_app.save()
+
+                if pending_app.tags:
+                    for tag in Tag.objects.filter(id__in=pending_app.tags):
+                        RedactorTagAssignment.objects.get_or_create(redactor=user, tag=tag)
+        elif profile.user_type == AccountType.STANDARD:
+            RedactorTagAssignment.objects.filter(redactor=user).delete()
+            Application.objects.filter(author=user, is_accepted=True).delete()
+
+
+@job("render_application_scans")
+def render_application_scans(application_id):
+    """Creates the thumbnail and web renditions of every scan of the application that has none."""
+    documents = list(ApplicationDocument.objects.filter(application_id=application_id, renditions__isnull=True))
+
+    # identical scans uploaded before already have renditions, which are shared
+    shared = {}
+    existing = ScanRendition.objects.filter(
+        document__sha256__in=[document.sha256 for document in documents if document.sha256]
+    ).select_related("document")
+    for rendition in existing:
+        shared.setdefault(rendition.document.sha256, {})[rendition.kind] = rendition
+    for document in [document for document in documents if document.sha256 in shared]:
+        renditions = shared[document.sha256]
+        with transaction.atomic():
+            # locked, so the release of their last other reference can't delete the files meanwhile
+            for rendition in renditions.values():
+                lock_file(rendition.file.name)
+            if not all(default_storage.exists(rendition.file.name) for rendition in renditions.values()):
+                continue
+            ScanRendition.objects.bulk_create([
+                ScanRendition(document=document, kind=kind, file=rendition.file.name, width=rendition.width,
+                              height=rendition.height, size=rendition.size)
+                for kind, rendition in renditions.items()
+            ])
+        documents.remove(document)
+
+    pending = [(document, scan_pool().submit(render_all, document.image.path)) for document in documents]
+
+    failed = []
+    for document, future in pending:
+        try:
+            rendered = future.result()
+        except Exception:
+            logger.warning("Could not render scan %s", document.pk, exc_info=True)
+            failed.append(document.pk)
+            continue
+
+        name = os.path.splitext(os.path.basename(document.image.name))[0]
+        with transaction.atomic():
+            for kind, (data, width, height) in rendered.items():
+                rendition = ScanRendition(document=document, kind=kind, width=width, height=height, size=len(data))
+                rendition.file.save(f"{name}.jpg", ContentFile(data), save=False)
+                rendition.save()
+
+    if failed:
+        # the rendered ones are skipped on the retry
+        raise RuntimeError(f"Could not render scans {failed}.")
@@ -0,0 +1,199 @@
+"""
+Rate limits for the endpoints a single client can exhaust the workers with, and load shedding
+for when the workers are exhausted anyway.
+"""
+import itertools
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.http import JsonResponse
+from rest_framework.settings import api_settings
+from rest_framework.throttling import SimpleRateThrottle
+
+from .cache import has_cached_response
+from .metrics import SHED
+from .models import ThrottleCounter
+
+THROTTLE_CACHE = "throttle"
+PURGE_EVERY = 1000
+
+_increments = itertools.count(1)
+
+
+def _count_in_table(key, window_end, using=DEFAULT_DB_ALIAS):
+    """One atomic upsert: the key's count in the window ending at `window_end`, this request included."""
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    table = qn(ThrottleCounter._meta.db_table)
+    key_column, window_column, count_column = qn("key"), qn("window_end"), qn("count")
+    with connection.cursor() as cursor:
+        if next(_increments) % PURGE_EVERY == 0:
+            cursor.execute(f"DELETE FROM {table} WHERE {window_column} < %s", [int(time.time())])
+        cursor.execute(
+            f"""
+            INSERT INTO {table} ({key_column}, {window_column}, {count_column}) VALUES (%s, %s, 1)
+            ON CONFLICT ({key_column}) DO UPDATE SET
+                {count_column} = CASE WHEN {table}.{window_column} = EXCLUDED.{window_column}
+                                      THEN {table}.{count_column} + 1 ELSE 1 END,
+                {window_column} = EXCLUDED.{window_column}
+            RETURNING {count_column}
+            """,
+            [key, window_end],
+        )
+        return cursor.fetchone()[0]
+
+
+def _count_in_cache(cache, key, window_end):
+    # redis and memcached add and increment atomically; the key expires with its window
+    key, timeout = f"{key}:{window_end}", max(1, window_end - int(time.time()))
+    cache.add(key, 0, timeout)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # expired between add and incr
+        cache.set(key, 1, timeout)
+        return 1
+
+
+def count_request(key, window_end):
+    """
+    Counts a request towards `key` in the window ending at `window_end` (epoch seconds) and
+    returns the count so far. In the ThrottleCounter table, or in the "throttle" cache when
+    one is configured; either way every worker shares the count and no increment is lost.
+    """
+    if THROTTLE_CACHE in settings.CACHES:
+        return _count_in_cache(caches[THROTTLE_CACHE], key, window_end)
+    return _count_in_table(key, window_end)
+
+
+class ScopedRateThrottle(SimpleRateThrottle):
+    """
+    Limits a view's `throttle_scope` to the rate configured for it, per user, or per client IP
+    for anonymous requests. Counts in fixed windows with one atomic increment (see count_request),
+    where DRF's throttles rewrite a list of timestamps in the cache per request. Anonymous requests
+    the response cache answers are neither counted nor limited: they cost less than the count.
+    """
+    scope_suffix = ""
+
+    def __init__(self):
+        # the rate depends on the view, so it is looked up in allow_request
+        pass
+
+    def get_ident(self, request):
+        if request.user and request.user.is_authenticated:
+            return f"user-{request.user.pk}"
+        return f"ip-{super().get_ident(request)}"
+
+    def allow_request(self, request, view):
+        scope = getattr(view, "throttle_scope", None)
+        if scope is None:
+            return True
+        self.scope = scope + self.scope_suffix
+        self.rate = api_settings.DEFAULT_THROTTLE_RATES.get(self.scope)
+        if self.rate is None:
+            return True
+        ident = self.get_ident(request)
+        if not ident or has_cached_response(request, getattr(view, request.method.lower(), None)):
+            return True
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+
+        now = self.timer()
+        window_end = (int(now // self.duration) + 1) * self.duration
+        count = count_request(self.cache_format % {"scope": self.scope, "ident": ident}, window_end)
+
+        self.wait_seconds = window_end - now
+        return count <= self.num_requests
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class LoginRateThrottle(ScopedRateThrottle):
+    """`<scope>_username`: per username tried, so guessing one password from many addresses is limited too."""
+    scope_suffix = "_username"
+
+    def get_ident(self, request):
+        username = request.data.get("username") if hasattr(request.data, "get") else None
+        return f"username-{username.strip().lower()}" if isinstance(username, str) and username.strip() else None
+
+
+def _queued_ms(header):
+    """Milliseconds since the proxy received the request, from X-Request-Start ("t=<epoch seconds>" from nginx)."""
+    try:
+        started = float(header.removeprefix("t="))
+    except ValueError:
+        return None
+    while started > 1e11:  # sent in milli- or microseconds
+        started /= 1000
+    return (time.time() - started) * 1000
+
+
+class LoadSheddingMiddleware:
+    """
+    Answers 503 with Retry-After at once, instead of queueing work nobody may wait for, when
+    - the request already waited MAX_QUEUE_MS in front of busy workers (X-Request-Start, set by nginx);
+    - this worker process has MAX_CONCURRENT_REQUESTS in flight (useful with ASGI workers,
+      a sync worker only ever has one).
+    Both are off at 0. /metrics is never shed, so overload stays visible.
+    """
+    sync_capable = True
+    async_capable = True
+    exempt_paths = ("/metrics",)
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+
+    def _admit(self, request):
+        """The reason to shed the request, or None once it has been counted as in flight."""
+        if request.path in self.exempt_paths:
+            return None
+        header = request.headers.get("X-Request-Start")
+        if settings.MAX_QUEUE_MS and header:
+            queued = _queued_ms(header)
+            if queued is not None and queued > settings.MAX_QUEUE_MS:
+                return "queue"
+        with self._lock:
+            if settings.MAX_CONCURRENT_REQUESTS and self._in_flight >= settings.MAX_CONCURRENT_REQUESTS:
+                return "concurrency"
+            self._in_flight += 1
+        request._load_shedding_counted = True
+        return None
+
+    def _release(self, request):
+        if getattr(request, "_load_shedding_counted", False):
+            with self._lock:
+                self._in_flight -= 1
+
+    def _busy(self, reason):
+        SHED.labels(reason).inc()
+        return JsonResponse({"detail": "The server is busy, please try again shortly."}, status=503,
+                            headers={"Retry-After": str(settings.SHED_RETRY_AFTER)})
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        reason = self._admit(request)
+        if reason:
+            return self._busy(reason)
+        try:
+            return self.get_response(request)
+        finally:
+            self._release(request)
+
+    async def __acall__(self, request):
+        reason = self._admit(request)
+        if reason:
+            return self._busy(reason)
+        try:
+            return await self.get_response(request)
+        finally:
+            self._release(request)
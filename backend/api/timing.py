@@ -0,0 +1,260 @@
+"""
+Per-request instrumentation: SQL (count and time), serializer, authentication/permission and
+total time of every request; the serializer and auth phases only cover the views and serializers
+that carry TimedViewMixin and TimedSerializerMixin. Reported in a Server-Timing header, logged when a request is slow,
+aggregated per view in this process (see view_stats and /api/timing/) and exported to
+Prometheus (api/metrics.py).
+"""
+import logging
+import re
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.utils.functional import SimpleLazyObject, empty
+from rest_framework.response import Response
+
+from .metrics import record_request
+
+logger = logging.getLogger(__name__)
+
+SAMPLES_PER_VIEW = 1000
+REPEATED_STATEMENTS_LOGGED = 3
+
+_current = ContextVar("request_timings", default=None)
+_placeholders = re.compile(r"%s(?:\s*,\s*%s)+")
+
+
+class RequestTimings:
+    def __init__(self):
+        self.queries = 0
+        self.phases = Counter()  # seconds per phase: "db", "serialize", "auth"
+        self.statements = defaultdict(lambda: [0, 0.0])  # normalized SQL -> [count, seconds]
+        self._active = set()
+
+    def add_query(self, sql, seconds):
+        self.queries += 1
+        self.phases["db"] += seconds
+        # "IN (%s, %s, %s)" and "IN (%s)" are the same statement
+        statement = self.statements[_placeholders.sub("%s, ...", sql)]
+        statement[0] += 1
+        statement[1] += seconds
+
+    def repeated_statements(self, limit=REPEATED_STATEMENTS_LOGGED):
+        repeated = [(count, seconds, sql) for sql, (count, seconds) in self.statements.items() if count > 1]
+        return sorted(repeated, reverse=True)[:limit]
+
+
+@contextmanager
+def timed(phase):
+    """Adds the time spent in the block to `phase` of the current request; nested blocks count once."""
+    timings = _current.get()
+    if timings is None or phase in timings._active:
+        yield
+        return
+    timings._active.add(phase)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.phases[phase] += time.perf_counter() - started
+        timings._active.discard(phase)
+
+
+def _record_sql(execute, sql, params, many, context):
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.add_query(sql, time.perf_counter() - started)
+
+
+# connected on import (see ApiConfig.ready), before any thread opens a connection; connections
+# are per thread, so every one of them gets the wrapper when it is opened
+@receiver(connection_created, dispatch_uid="api-timing-sql")
+def _install_sql_wrapper(connection, **kwargs):
+    if _record_sql not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_sql)
+
+
+class TimedViewMixin:
+    """
+    First base of every API view: authentication, permissions and throttles (`initial`, which
+    adrf's async views run as well) count as "auth", rendering the response as "serialize".
+    """
+
+    def initial(self, request, *args, **kwargs):
+        with timed("auth"):
+            super().initial(request, *args, **kwargs)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if isinstance(response, Response):
+            # rendered here rather than by the handler, so the JSON encoding is timed with the view
+            with timed("serialize"):
+                response.render()
+        return response
+
+
+class TimedSerializerMixin:
+    """
+    Counts `.data` as "serialize". A list is rendered through its ListSerializer, which never
+    reads the child's `.data`, so to_representation counts too; nested calls count once.
+    """
+
+    @property
+    def data(self):
+        with timed("serialize"):
+            return super().data
+
+    def to_representation(self, instance):
+        with timed("serialize"):
+            return super().to_representation(instance)
+
+
+class ViewStats:
+    """Per view request counts, durations and queries of this process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+
+    def record(self, view, status, seconds, timings):
+        with self._lock:
+            stats = self._views.get(view)
+            if stats is None:
+                stats = self._views[view] = {
+                    "requests": 0, "errors": 0, "seconds": 0.0, "max_seconds": 0.0, "queries": 0,
+                    "phases": Counter(), "samples": deque(maxlen=SAMPLES_PER_VIEW),
+                }
+            stats["requests"] += 1
+            stats["errors"] += status >= 500
+            stats["seconds"] += seconds
+            stats["max_seconds"] = max(stats["max_seconds"], seconds)
+            stats["queries"] += timings.queries
+            stats["phases"].update(timings.phases)
+            stats["samples"].append(seconds)
+
+    def snapshot(self):
+        with self._lock:
+            views = {view: (dict(stats), sorted(stats["samples"])) for view, stats in self._views.items()}
+
+        result = {}
+        for view, (stats, samples) in views.items():
+            n = stats["requests"]
+            result[view] = {
+                "requests": n,
+                "errors": stats["errors"],
+                "mean_ms": round(stats["seconds"] / n * 1000, 2),
+                "p50_ms": round(samples[len(samples) // 2] * 1000, 2),
+                "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000, 2),
+                "max_ms": round(stats["max_seconds"] * 1000, 2),
+                "queries_per_request": round(stats["queries"] / n, 2),
+                **{f"{phase}_ms_per_request": round(seconds / n * 1000, 2)
+                   for phase, seconds in sorted(stats["phases"].items())},
+            }
+        return dict(sorted(result.items(), key=lambda item: item[1]["mean_ms"] * item[1]["requests"], reverse=True))
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+
+
+view_stats = ViewStats()
+
+
+def _route(request):
+    # the URL pattern, not the path, so ids don't multiply the entries
+    match = getattr(request, "resolver_match", None)
+    return "/" + match.route if match else "<unresolved>"
+
+
+def _view_name(request):
+    return f"{request.method} {_route(request)}"
+
+
+def _is_staff(request):
+    user = getattr(request, "user", None)
+    if isinstance(user, SimpleLazyObject) and user._wrapped is empty:
+        # nothing looked the user up (DRF replaces it with the one it authenticated); don't hit the session now
+        return False
+    return getattr(user, "is_staff", False)
+
+
+def _server_timing(timings, seconds):
+    return ", ".join([
+        f'db;dur={timings.phases["db"] * 1000:.1f};desc="{timings.queries} queries"',
+        f'serialize;dur={timings.phases["serialize"] * 1000:.1f}',
+        f'auth;dur={timings.phases["auth"] * 1000:.1f}',
+        f'view;dur={seconds * 1000:.1f}',
+    ])
+
+
+def _log_slow(request, response, seconds, timings):
+    repeated = "; ".join(
+        f"{count}x {spent * 1000:.1f} ms {sql[:200]}" for count, spent, sql in timings.repeated_statements()
+    )
+    logger.warning(
+        "Slow request %s %s %s in %.0f ms: %d queries (%.0f ms SQL), serialize %.0f ms, auth %.0f ms%s",
+        request.method, request.get_full_path(), response.status_code, seconds * 1000, timings.queries,
+        timings.phases["db"] * 1000, timings.phases["serialize"] * 1000, timings.phases["auth"] * 1000,
+        f"; repeated: {repeated}" if repeated else "",
+    )
+
+
+class RequestTimingMiddleware:
+    """
+    Times each request from here inwards, so it goes first in MIDDLEWARE. The header goes to
+    staff users (as authenticated by DRF), or to everyone with SERVER_TIMING; requests slower
+    than SLOW_REQUEST_MS are logged to "api.timing". Streamed bodies are not included.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        timings = RequestTimings()
+        token = _current.set(timings)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, time.perf_counter() - started, timings)
+
+    async def __acall__(self, request):
+        timings = RequestTimings()
+        token = _current.set(timings)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, time.perf_counter() - started, timings)
+
+    def _finish(self, request, response, seconds, timings):
+        view_stats.record(_view_name(request), response.status_code, seconds, timings)
+        record_request(request.method, _route(request), response.status_code, seconds, timings)
+
+        if settings.SERVER_TIMING or _is_staff(request):
+            response["Server-Timing"] = _server_timing(timings, seconds)
+        if seconds * 1000 >= settings.SLOW_REQUEST_MS:
+            _log_slow(request, response, seconds, timings)
+        return response
@@ -0,0 +1,132 @@
+"""
+Scan uploads: streamed to disk with size caps, hashed on the way in, and stored once per
+content. A stored file is shared by every ApplicationDocument with the same bytes and is
+deleted with the last of them (see api/signals.py).
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+from django.core.files.uploadhandler import StopUpload, TemporaryFileUploadHandler
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.parsers import MultiPartParser
+
+from .models import SharedFile
+
+SCAN_DIR = "application_scans"
+
+
+class UploadTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = "The upload is too large."
+    default_code = "upload_too_large"
+
+
+def _megabytes(size):
+    return f"{size / (1024 * 1024):g} MB"
+
+
+class ScanUploadHandler(TemporaryFileUploadHandler):
+    """
+    Writes each file straight to a temporary file (never to memory) and hashes it chunk by
+    chunk. Going over a limit stops the upload; the parser then reports the error.
+    """
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.error = None
+        self.files = 0
+        self.total_size = 0
+
+    def _stop(self, message):
+        self.error = message
+        raise StopUpload(connection_reset=False)
+
+    def new_file(self, *args, **kwargs):
+        self.files += 1
+        if self.files > settings.SCAN_MAX_FILES:
+            self._stop(f"At most {settings.SCAN_MAX_FILES} scans can be uploaded at once.")
+        super().new_file(*args, **kwargs)
+        self.size = 0
+        self.sha256 = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.size += len(raw_data)
+        self.total_size += len(raw_data)
+        if self.size > settings.SCAN_MAX_FILE_SIZE:
+            self._stop(f"Each scan can be at most {_megabytes(settings.SCAN_MAX_FILE_SIZE)}.")
+        if self.total_size > settings.SCAN_MAX_REQUEST_SIZE:
+            self._stop(f"All scans together can be at most {_megabytes(settings.SCAN_MAX_REQUEST_SIZE)}.")
+        self.sha256.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        file.sha256 = self.sha256.hexdigest()
+        return file
+
+
+class ScanMultiPartParser(MultiPartParser):
+    """Multipart parser for scan uploads, see ScanUploadHandler."""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        request = parser_context["request"]
+        # refuse before reading anything when the client already says it is too much
+        if int(request.META.get("CONTENT_LENGTH") or 0) > settings.SCAN_MAX_REQUEST_SIZE:
+            raise UploadTooLarge(f"All scans together can be at most {_megabytes(settings.SCAN_MAX_REQUEST_SIZE)}.")
+
+        handler = ScanUploadHandler(request._request)
+        request._request.upload_handlers = [handler]
+        data_and_files = super().parse(stream, media_type, parser_context)
+        if handler.error:
+            raise UploadTooLarge(handler.error)
+        return data_and_files
+
+
+def file_sha256(file):
+    digest = hashlib.sha256()
+    for chunk in file.chunks():
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def lock_file(name):
+    """
+    Locks the shared file `name` until the current transaction ends, by writing its SharedFile
+    row (a row lock on PostgreSQL, the write lock on SQLite).
+    """
+    SharedFile.objects.bulk_create([SharedFile(name=name, locked_at=timezone.now())], update_conflicts=True,
+                                   unique_fields=["name"], update_fields=["locked_at"])
+
+
+def store_scan(file, extension):
+    """
+    Saves the upload under its content hash unless identical bytes are stored already. Call it
+    in the transaction that creates the row referring to the file: the file stays locked until
+    that row is committed, so a release of the last other reference can't delete it meanwhile.
+    Returns (storage name, sha256).
+    """
+    digest = getattr(file, "sha256", None) or file_sha256(file)
+    name = f"{SCAN_DIR}/{digest[:2]}/{digest}.{extension}"
+    lock_file(name)
+    if not default_storage.exists(name):
+        default_storage.save(name, file)
+    return name, digest
+
+
+def release_file(name, is_referenced):
+    """
+    Deletes a shared file once nothing refers to it any more. Runs after the deleting transaction
+    has committed and checks the references under the file's lock, so it sees every new reference.
+    """
+    if not name:
+        return
+    with transaction.atomic():
+        lock_file(name)
+        if not is_referenced():
+            default_storage.delete(name)
+            SharedFile.objects.filter(name=name).delete()
@@ -3,9 +3,15 @@ from . import views
 
 urlpatterns = [
     path("entries/", views.EntryListCreate.as_view(), name='entries'),
+    path('entries/export/', views.EntryExportView.as_view(), name='entries-export'),
     path('entries/<int:pk>/', views.EntryDetailView.as_view(), name='entry'),
     path('entries/<int:pk>/upvote/', views.EntryRateView.as_view(), name="entry-upvote"),
     path('ranking/', views.RankingView.as_view(), name='ranking'),
+    path('ranking/entries/', views.EntryRankingView.as_view(), name='entry-ranking'),
+    path('jobs/', views.JobQueueView.as_view(), name='jobs'),
+    path('timing/', views.TimingStatsView.as_view(), name='timing'),
+    path('import/', views.ImportView.as_view(), name='import'),
+    path('search/', views.SearchView.as_view(), name='search'),
     path('categories/', views.TagListCreate.as_view(), name='categories'),
     path('categories/<int:pk>/', views.TagDetailView.as_view(), name='category'),
     path('applications/', views.ApplicationListCreateView.as_view(), name='application-list-create'),
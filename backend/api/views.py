@@ -1,20 +1,39 @@
-import os
 
-from django.conf import settings
 from django.db import transaction
-from django.shortcuts import render
+from django.db.models import Exists, OuterRef
 from django.contrib.auth.models import User
-from rest_framework import generics, permissions, status, parsers
+from adrf.generics import GenericAPIView as AsyncGenericAPIView
+from adrf.views import APIView as AsyncAPIView
+from asgiref.sync import sync_to_async
+from rest_framework import generics, mixins, permissions, status, parsers
 from rest_framework.generics import ListAPIView, RetrieveUpdateDestroyAPIView
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from django.http import FileResponse, HttpResponseForbidden, Http404
+from rest_framework_simplejwt.views import TokenObtainPairView
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-from collections import Counter
-from urllib.parse import urlparse
 
-from .models import Profile, Upvote, Entry, Tag, Application, ApplicationDocument, AccountType, RedactorTagAssignment, Request
-from .serializers import UserRegisterSerializer, UserSerializer, UserProfileSerializer, EntrySerializer, TagSerializer, RequestSerializer
+from .ranking import RANKING_SIZE, ranked_domains
+from .votes import add_upvote, remove_upvote, avoted_entry_ids
+from .search import search_documents
+from .tags import aload_tag_names
+from .auth import get_principal
+from .routing import read_from_replica
+from .cache import cache_anonymous_response
+from .export import EXPORT_FORMATS, iter_export, aiter_export, parse_since
+from .importer import import_records
+from .jobs import queue_stats
+from .metrics import CLAIMS, count_on_commit
+from .throttling import LoginRateThrottle, ScopedRateThrottle
+from .timing import TimedViewMixin, view_stats
+from .media import serve_protected
+from .uploads import ScanMultiPartParser
+from .tasks import apply_role_change
+from .pagination import CreatedAtCursorPagination, DateJoinedCursorPagination, OldestFirstCursorPagination, SearchPagination
+from .models import Profile, Entry, Tag, Application, ApplicationDocument, Request, RequestTagAssignment, SearchKind
+from .serializers import (UserRegisterSerializer, UserSerializer, UserProfileSerializer, EntrySerializer, TagSerializer,
+    RequestSerializer, MAX_REQUESTS_PER_POST)
 from rest_framework.permissions import AllowAny, IsAuthenticated, IsAuthenticatedOrReadOnly, IsAdminUser
 from .permissions import (IsAuthorOrAdmin, IsAuthorOrAdminOrReadOnly, IsAdminOrSelf, IsRedactorOrReadOnlyObject,
     IsAuthor, IsRedactor, CanCreateApplication, IsRedactorOrAdmin)
@@ -25,12 +44,20 @@ from .serializers import (
 
 
 # Create your views here.
-class CreateUserView(generics.CreateAPIView):
+class CreateUserView(TimedViewMixin, generics.CreateAPIView):
     queryset = User.objects.all()
     serializer_class = UserRegisterSerializer
     permission_classes = [AllowAny]
+    throttle_classes = [ScopedRateThrottle]
+    throttle_scope = "register"
 
-class ChangeProfileTypeView(generics.UpdateAPIView):
+
+class TokenObtainView(TimedViewMixin, TokenObtainPairView):
+    # every attempt hashes a password, so guesses are limited per address and per username
+    throttle_classes = [ScopedRateThrottle, LoginRateThrottle]
+    throttle_scope = "login"
+
+class ChangeProfileTypeView(TimedViewMixin, generics.UpdateAPIView):
     queryset = Profile.objects.all()
     serializer_class = UserProfileSerializer
     permission_classes = [permissions.IsAdminUser]
@@ -41,42 +68,21 @@ class ChangeProfileTypeView(generics.UpdateAPIView):
 
     def perform_update(self, serializer):
         with transaction.atomic():
-            
             profile = serializer.save()
-            user = profile.user
-            new_role = profile.user_type
-
-            if new_role == AccountType.REDACTOR:
-                pending_app = Application.objects.filter(author=user, is_accepted=False).first()
-                
-                if pending_app:
-                    pending_app.is_accepted = True
-                    pending_app.save()
-                    tags_ids = pending_app.tags
-                    
-                    if tags_ids:
-                        tags_to_add = Tag.objects.filter(id__in=tags_ids)
-                        
-                        for tag in tags_to_add:
-                            RedactorTagAssignment.objects.get_or_create(
-                                redactor=user, 
-                                tag=tag
-                            )
-            elif new_role == AccountType.STANDARD:
-                RedactorTagAssignment.objects.filter(redactor=user).delete()
-                Application.objects.filter(author=user, is_accepted=True).delete()
-
-
-
-class CurrentUserView(APIView):
+            # accepting the application and (un)assigning tags happens in the worker
+            apply_role_change.enqueue(user_id=profile.user_id, dedupe_key=f"role:{profile.user_id}")
+
+
+class CurrentUserView(TimedViewMixin, AsyncAPIView):
     permission_classes = [IsAuthenticated]
 
-    def get(self, request):
-        serializer = CurrentUserSerializer(request.user)
+    async def get(self, request):
+        user = await User.objects.select_related("profile").aget(pk=request.user.pk)
+        serializer = CurrentUserSerializer(user)
         return Response(serializer.data)
 
 
-class UserDetailView(RetrieveUpdateDestroyAPIView):
+class UserDetailView(TimedViewMixin, RetrieveUpdateDestroyAPIView):
     queryset = User.objects.all()
     serializer_class = UserSerializer
 
@@ -92,13 +98,16 @@ class UserDetailView(RetrieveUpdateDestroyAPIView):
 
         return super().get_permissions()
 
-class UsersAll(ListAPIView):
+class UsersAll(TimedViewMixin, ListAPIView):
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [IsAdminUser]
+    pagination_class = DateJoinedCursorPagination
 
-class EntryListCreate(generics.ListCreateAPIView):
+class EntryListCreate(TimedViewMixin, mixins.ListModelMixin, mixins.CreateModelMixin, AsyncGenericAPIView):
     serializer_class = EntrySerializer
+    pagination_class = CreatedAtCursorPagination
+
     def get_permissions(self):
         if self.request.method == "GET":
             return [AllowAny()]
@@ -110,18 +119,51 @@ class EntryListCreate(generics.ListCreateAPIView):
         return super().get_permissions()
 
     def get_queryset(self):
-        user = self.request.user
-        return Entry.objects.all()
+        return EntrySerializer.setup_eager_loading(Entry.objects.all())
+
+    @cache_anonymous_response("entries")
+    @read_from_replica
+    async def get(self, request, *args, **kwargs):
+        page = await self.apaginate_queryset(self.filter_queryset(self.get_queryset()))
+        context = self.get_serializer_context()
+        context["voted_entry_ids"] = await avoted_entry_ids(request.user, page)
+        await aload_tag_names(tag_ids=EntrySerializer.rendered_tag_ids(page))
+        serializer = self.get_serializer(page, many=True, context=context)
+        return await self.get_apaginated_response(serializer.data)
 
+    async def post(self, request, *args, **kwargs):
+        return await sync_to_async(self.create)(request, *args, **kwargs)
 
     def perform_create(self, serializer):
 
             serializer.save(author=self.request.user)
 
             
-class EntryDetailView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = Entry.objects.all()
+class EntryDetailView(TimedViewMixin, mixins.RetrieveModelMixin, mixins.UpdateModelMixin,
+                      mixins.DestroyModelMixin, AsyncGenericAPIView):
     serializer_class = EntrySerializer
+
+    def get_queryset(self):
+        return EntrySerializer.setup_eager_loading(Entry.objects.all())
+
+    @cache_anonymous_response("entries")
+    @read_from_replica
+    async def get(self, request, *args, **kwargs):
+        entry = await self.aget_object()
+        context = self.get_serializer_context()
+        context["voted_entry_ids"] = await avoted_entry_ids(request.user, [entry])
+        await aload_tag_names(tag_ids=EntrySerializer.rendered_tag_ids([entry]))
+        return Response(self.get_serializer(entry, context=context).data)
+
+    async def put(self, request, *args, **kwargs):
+        return await sync_to_async(self.update)(request, *args, **kwargs)
+
+    async def patch(self, request, *args, **kwargs):
+        return await sync_to_async(self.partial_update)(request, *args, **kwargs)
+
+    async def delete(self, request, *args, **kwargs):
+        return await sync_to_async(self.destroy)(request, *args, **kwargs)
+
     def get_permissions(self):
         if self.request.method == "GET":
             return [AllowAny()]
@@ -135,72 +177,53 @@ class EntryDetailView(generics.RetrieveUpdateDestroyAPIView):
         return super().get_permissions()
 
 
-class EntryRateView(APIView):
+class EntryRateView(TimedViewMixin, APIView):
     permission_classes = [permissions.IsAuthenticated]
+    throttle_classes = [ScopedRateThrottle]
+    throttle_scope = "upvote"
 
     def post(self, request, pk):
-            entry = get_object_or_404(Entry, pk=pk)
-            Upvote.objects.get_or_create(user=request.user,entry=entry)
-
-            return Response(status=status.HTTP_204_NO_CONTENT)
+        upvotes_count = add_upvote(request.user, pk)
+        if upvotes_count is None:
+            raise Http404
+        return Response({"upvotes_count": upvotes_count, "user_vote": True}, status=status.HTTP_200_OK)
 
     def delete(self, request, pk):
-        entry = get_object_or_404(Entry, pk=pk)
-        Upvote.objects.filter(
-            user=request.user,
-            entry=entry
-        ).delete()
-        return Response(status=status.HTTP_204_NO_CONTENT)
+        upvotes_count = remove_upvote(request.user, pk)
+        if upvotes_count is None:
+            raise Http404
+        return Response({"upvotes_count": upvotes_count, "user_vote": False}, status=status.HTTP_200_OK)
 
-class RankingView(APIView):
+class RankingView(TimedViewMixin, AsyncAPIView):
     permission_classes = [AllowAny]
+    throttle_classes = [ScopedRateThrottle]
+    throttle_scope = "ranking"
 
-    def get(self, request):
-        fake_entries = Entry.objects.filter(is_truthful=False)
-        domain_counter = Counter()
-        for entry in fake_entries:
-
-            links_to_analyze = entry.articles or [] #this is empty!
-            for link in links_to_analyze:
-                if not link: continue
-                try:
-                    if "://" not in link:
-                        link = "http://" + link
-                    parsed_uri = urlparse(link)
-                    domain = parsed_uri.netloc.lower()
-
-
-                    if domain.startswith('www.'):
-                        domain = domain[4:]
-                    
-                    if domain:
-                        domain_counter[domain] += 1
-                except Exception:
-                    continue
-
-        sorted_domains = domain_counter.most_common()        
-        ranking_list = []
-        current_rank = 0
-        last_count = -1
-        
-        for i, (domain, count) in enumerate(sorted_domains):
-            if count != last_count:
-                current_rank += 1
-            
-            last_count = count
-
-            if current_rank > 25:
-                break
+    @cache_anonymous_response("ranking")
+    @read_from_replica
+    async def get(self, request):
+        return Response([row async for row in ranked_domains()])
 
-            ranking_list.append({
-                "rank": current_rank,
-                "domain": domain,
-                "count": count
-            })
-
-        return Response(ranking_list)
+class EntryRankingView(TimedViewMixin, AsyncGenericAPIView):
+    """The RANKING_SIZE most upvoted entries."""
+    serializer_class = EntrySerializer
+    permission_classes = [AllowAny]
+    throttle_classes = [ScopedRateThrottle]
+    throttle_scope = "ranking"
 
-class TagListCreate(generics.ListCreateAPIView):
+    def get_queryset(self):
+        return EntrySerializer.setup_eager_loading(Entry.objects.order_by("-upvotes_count", "-id"))[:RANKING_SIZE]
+
+    @cache_anonymous_response("entries")
+    @read_from_replica
+    async def get(self, request):
+        entries = [entry async for entry in self.get_queryset()]
+        context = self.get_serializer_context()
+        context["voted_entry_ids"] = await avoted_entry_ids(request.user, entries)
+        await aload_tag_names(tag_ids=EntrySerializer.rendered_tag_ids(entries))
+        return Response(self.get_serializer(entries, many=True, context=context).data)
+
+class TagListCreate(TimedViewMixin, mixins.ListModelMixin, mixins.CreateModelMixin, AsyncGenericAPIView):
     serializer_class = TagSerializer
 
     def get_permissions(self):
@@ -214,9 +237,18 @@ class TagListCreate(generics.ListCreateAPIView):
     def get_queryset(self):
         return Tag.objects.all()
 
-class TagDetailView(APIView):
+    @cache_anonymous_response("tags")
+    async def get(self, request, *args, **kwargs):
+        names = await aload_tag_names(recheck=True)
+        return Response([{"id": tag_id, "name": name} for tag_id, name in names.items()])
+
+    async def post(self, request, *args, **kwargs):
+        return await sync_to_async(self.create)(request, *args, **kwargs)
+
+class TagDetailView(TimedViewMixin, APIView):
     permission_classes = [permissions.AllowAny]
 
+    @read_from_replica
     def get(self, request, pk):
         tag = get_object_or_404(Tag, pk=pk)
         return Response(TagSerializer(tag).data, status=status.HTTP_200_OK)
@@ -228,9 +260,11 @@ class TagDetailView(APIView):
             tag.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
-class ApplicationListCreateView(generics.ListCreateAPIView):
+class ApplicationListCreateView(TimedViewMixin, generics.ListCreateAPIView):
     queryset = Application.objects.all()
-    
+    pagination_class = CreatedAtCursorPagination
+    parser_classes = [ScanMultiPartParser]
+
     def get_serializer_class(self):
         
         if self.request.method == 'POST':
@@ -244,39 +278,35 @@ class ApplicationListCreateView(generics.ListCreateAPIView):
         return [permissions.IsAdminUser()]
 
 
-class ApplicationDetailView(generics.RetrieveDestroyAPIView):
-    queryset = Application.objects.all()
+class ApplicationDetailView(TimedViewMixin, generics.RetrieveDestroyAPIView):
+    queryset = Application.objects.prefetch_related("scans__renditions")
     serializer_class = ApplicationDetailSerializer
     permission_classes = [permissions.IsAdminUser]
 
 
-class UserAcceptedApplicationView(APIView):
+class UserAcceptedApplicationView(TimedViewMixin, APIView):
     permission_classes = [permissions.IsAdminUser]
 
     def get(self, request, pk):
         user = get_object_or_404(User, pk=pk)
-        accepted_app = Application.objects.filter(author=user, is_accepted=True).last()
+        accepted_app = Application.objects.filter(author=user, is_accepted=True).prefetch_related("scans__renditions").last()
         
         if accepted_app:
-            serializer = ApplicationDetailSerializer(accepted_app)
+            serializer = ApplicationDetailSerializer(accepted_app, context={"request": request})
             return Response(serializer.data)
         else:
             return Response(status=status.HTTP_204_NO_CONTENT)
 
 
 
-class ProtectedMediaView(APIView):
+class ProtectedMediaView(TimedViewMixin, APIView):
     permission_classes = [IsAdminUser]
     def get(self, request, path):
-        file_path = os.path.join(settings.MEDIA_ROOT, path)
+        return serve_protected(request._request, path)
 
-        if not os.path.exists(file_path):
-            raise Http404
-
-        return FileResponse(open(file_path, "rb"), content_type="image/png")
-
-class RequestListCreate(generics.ListCreateAPIView):
+class RequestListCreate(TimedViewMixin, generics.ListCreateAPIView):
     serializer_class = RequestSerializer
+    pagination_class = CreatedAtCursorPagination
 
     def get_permissions(self):
         if self.request.method == "GET":
@@ -287,16 +317,23 @@ class RequestListCreate(generics.ListCreateAPIView):
         return super().get_permissions()
 
     def get_queryset(self):
-        return Request.objects.filter(entry_id__isnull=True)
+        return RequestSerializer.setup_eager_loading(Request.objects.filter(entry_id__isnull=True))
+
+    def get_serializer(self, *args, **kwargs):
+        # a JSON array submits several requests in one round-trip
+        if isinstance(kwargs.get("data"), list):
+            kwargs.update(many=True, allow_empty=False, max_length=MAX_REQUESTS_PER_POST)
+        return super().get_serializer(*args, **kwargs)
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
-class RequestDetailView(APIView):
+class RequestDetailView(TimedViewMixin, APIView):
     def get(self, request, pk):
         req = get_object_or_404(Request, pk=pk)
 
-        if request.user.is_staff or request.user.profile.user_type == "redactor":
+        principal = get_principal(request.user)
+        if principal.is_staff or principal.is_redactor:
             return Response(RequestSerializer(req).data, status=status.HTTP_200_OK)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
@@ -306,8 +343,9 @@ class RequestDetailView(APIView):
             req.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
-class RequestUnassignedListView(generics.ListCreateAPIView):
+class RequestUnassignedListView(TimedViewMixin, generics.ListCreateAPIView):
     serializer_class = RequestSerializer
+    pagination_class = OldestFirstCursorPagination
 
     def get_permissions(self):
         if self.request.method == "GET":
@@ -317,24 +355,18 @@ class RequestUnassignedListView(generics.ListCreateAPIView):
 
     def get_queryset(self):
         unassigned_requests = Request.objects.filter(redactor__isnull=True)
-        if self.request.user.is_staff:
-            return unassigned_requests
-
-        rows_user = self.request.user.assigned_tags.all()
-        tag_ids_user = [row.tag.id for row in rows_user]
-
-        result_req = []
-        for request in unassigned_requests:
-            rows_req = request.assigned_tags.all()
-            tag_ids_req = [row.tag.id for row in rows_req]
-            for tag_id_user in tag_ids_user:
-                if tag_id_user in tag_ids_req:
-                    result_req.append(request)
-                    break
-
-        return result_req
-
-class RequestAssignedListView(ListAPIView):
+        principal = get_principal(self.request.user)
+        if not principal.is_staff:
+            # requests sharing at least one tag with the redactor; the tag ids come with the token.
+            # A correlated EXISTS rather than a join, so the page is read in request_unassigned_idx
+            # order with no DISTINCT and no sort
+            unassigned_requests = unassigned_requests.filter(Exists(
+                RequestTagAssignment.objects.filter(request=OuterRef("pk"), tag_id__in=principal.tag_ids)
+            ))
+
+        return RequestSerializer.setup_eager_loading(unassigned_requests)
+
+class RequestAssignedListView(TimedViewMixin, ListAPIView):
     serializer_class = RequestSerializer
 
     def get_permissions(self):
@@ -344,10 +376,11 @@ class RequestAssignedListView(ListAPIView):
         return super().get_permissions()
 
     def get_queryset(self):
-        return Request.objects.filter(redactor=self.request.user.id)
+        return RequestSerializer.setup_eager_loading(Request.objects.filter(redactor=self.request.user.id))
 
-class RequestClosedListView(ListAPIView):
+class RequestClosedListView(TimedViewMixin, ListAPIView):
     serializer_class = RequestSerializer
+    pagination_class = CreatedAtCursorPagination
 
     def get_permissions(self):
         if self.request.method == "GET":
@@ -356,15 +389,16 @@ class RequestClosedListView(ListAPIView):
         return super().get_permissions()
 
     def get_queryset(self):
-        return Request.objects.filter(entry_id__isnull=False)
+        return RequestSerializer.setup_eager_loading(Request.objects.filter(entry_id__isnull=False))
 
-class RequestAssignView(APIView):
+class RequestAssignView(TimedViewMixin, APIView):
     def post(self, request, pk):
         req = get_object_or_404(Request, pk=pk)
 
-        if request.user.profile.user_type == 'redactor':
+        if get_principal(request.user).is_redactor:
             req.redactor = request.user
             req.save()
+            count_on_commit(CLAIMS)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     def delete(self, request, pk):
@@ -373,4 +407,101 @@ class RequestAssignView(APIView):
         if request.user.is_staff or request.user==req.redactor:
             req.redactor = None
             req.save()
-        return Response(status=status.HTTP_204_NO_CONTENT)
\ No newline at end of file
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class SearchView(TimedViewMixin, APIView):
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        query = request.query_params.get("q", "").strip()
+        kind = request.query_params.get("type", SearchKind.ENTRY)
+        if kind not in SearchKind.values:
+            return Response({"type": f"Must be one of: {', '.join(SearchKind.values)}."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if not query:
+            return Response({"q": "This parameter is required."}, status=status.HTTP_400_BAD_REQUEST)
+
+        if kind == SearchKind.REQUEST and not IsRedactorOrAdmin().has_permission(request, self):
+            self.permission_denied(request)
+
+        tag_id = request.query_params.get("tag")
+        if tag_id is not None and not tag_id.isdigit():
+            return Response({"tag": "A valid integer is required."}, status=status.HTTP_400_BAD_REQUEST)
+
+        verdict = request.query_params.get("verdict")
+        is_truthful = {"true": True, "false": False}.get(verdict.lower()) if verdict is not None else None
+        if verdict is not None and is_truthful is None:
+            return Response({"verdict": "Must be 'true' or 'false'."}, status=status.HTTP_400_BAD_REQUEST)
+
+        results = search_documents(query, kind, tag_id=int(tag_id) if tag_id else None, is_truthful=is_truthful)
+        paginator = SearchPagination()
+        ids = paginator.paginate_queryset(results, request, view=self)
+
+        if kind == SearchKind.ENTRY:
+            model, serializer_class = Entry, EntrySerializer
+        else:
+            model, serializer_class = Request, RequestSerializer
+        found = serializer_class.setup_eager_loading(model.objects.filter(pk__in=ids)).in_bulk()
+        objects = [found[pk] for pk in ids if pk in found]
+
+        serializer = serializer_class(objects, many=True, context={"request": request})
+        return paginator.get_paginated_response(serializer.data)
+
+
+class EntryExportView(TimedViewMixin, APIView):
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        export_format = request.query_params.get("output", "ndjson")
+        if export_format not in EXPORT_FORMATS:
+            return Response({"output": f"Must be one of: {', '.join(EXPORT_FORMATS)}."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        since = request.query_params.get("since")
+        if since is not None:
+            since = parse_since(since)
+            if since is None:
+                return Response({"since": "Must be an ISO 8601 date or datetime."},
+                                status=status.HTTP_400_BAD_REQUEST)
+
+        lines = iter_export(export_format, since=since)
+        if isinstance(request._request, ASGIRequest):
+            lines = aiter_export(lines)
+
+        response = StreamingHttpResponse(lines, content_type=EXPORT_FORMATS[export_format])
+        response["Content-Disposition"] = f'attachment; filename="entries.{export_format}"'
+        return response
+
+
+class ImportView(TimedViewMixin, APIView):
+    """Admin-only bulk import of an NDJSON file (see api/importer.py for the line format)."""
+    permission_classes = [IsAdminUser]
+    parser_classes = [parsers.MultiPartParser]
+
+    def post(self, request):
+        upload = request.FILES.get("file")
+        if upload is None:
+            return Response({"file": "An NDJSON file is required."}, status=status.HTTP_400_BAD_REQUEST)
+
+        report = import_records(upload, default_author=request.user)
+        return Response(report.as_dict(), status=status.HTTP_200_OK)
+
+
+class JobQueueView(TimedViewMixin, APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(queue_stats())
+
+
+class TimingStatsView(TimedViewMixin, APIView):
+    """Request statistics per view, since the start of this worker process (each worker has its own)."""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(view_stats.snapshot())
+
+    def delete(self, request):
+        view_stats.reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)
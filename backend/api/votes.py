@@ -0,0 +1,73 @@
+from django.db import connection, transaction
+from django.db.models import F
+
+from .cache import bump_resources
+from .metrics import UPVOTES, count_on_commit
+from .models import Entry, Upvote
+
+
+def _current_count(entry_id):
+    return Entry.objects.filter(pk=entry_id).values_list("upvotes_count", flat=True).first()
+
+
+def add_upvote(user, entry_id):
+    """
+    Records the user's upvote with a single insert-if-absent statement and bumps the
+    stored counter in the same transaction. Returns the new count, or None if the
+    entry does not exist.
+    """
+    qn = connection.ops.quote_name
+    upvote_table = qn(Upvote._meta.db_table)
+    entry_table = qn(Entry._meta.db_table)
+
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {upvote_table} ({qn('user_id')}, {qn('entry_id')}) "
+                f"SELECT %s, {qn('id')} FROM {entry_table} WHERE {qn('id')} = %s "
+                f"ON CONFLICT ({qn('user_id')}, {qn('entry_id')}) DO NOTHING",
+                [user.id, entry_id],
+            )
+            inserted = cursor.rowcount == 1
+
+        if inserted:
+            Entry.objects.filter(pk=entry_id).update(upvotes_count=F("upvotes_count") + 1)
+            bump_resources("entries")
+            count_on_commit(UPVOTES, action="add")
+        return _current_count(entry_id)
+
+
+def remove_upvote(user, entry_id):
+    """Counterpart of add_upvote: one DELETE, and a decrement only if a row was removed."""
+    qn = connection.ops.quote_name
+    upvote_table = qn(Upvote._meta.db_table)
+
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {upvote_table} WHERE {qn('user_id')} = %s AND {qn('entry_id')} = %s",
+                [user.id, entry_id],
+            )
+            deleted = cursor.rowcount > 0
+
+        if deleted:
+            Entry.objects.filter(pk=entry_id).update(upvotes_count=F("upvotes_count") - 1)
+            bump_resources("entries")
+            count_on_commit(UPVOTES, action="remove")
+        return _current_count(entry_id)
+
+
+def voted_entry_ids(user, entries):
+    """Ids of the given entries the user has upvoted, in one query."""
+    if user is None or not user.is_authenticated:
+        return set()
+    return set(Upvote.objects.filter(user=user, entry__in=entries).values_list("entry_id", flat=True))
+
+
+async def avoted_entry_ids(user, entries):
+    if user is None or not user.is_authenticated:
+        return set()
+    return {
+        entry_id async for entry_id in
+        Upvote.objects.filter(user=user, entry__in=entries).values_list("entry_id", flat=True)
+    }
@@ -0,0 +1,92 @@
+"""
+Builds Django DATABASES entries from URL-style strings, e.g.
+
+    sqlite:///DATA/db.sqlite3               (relative to the backend directory)
+    sqlite:////var/lib/debunk/db.sqlite3    (absolute path)
+    postgres://user:password@db:5432/debunk?sslmode=require
+"""
+import os
+from pathlib import Path
+from urllib.parse import urlsplit, unquote, parse_qsl
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+ENGINES = {
+    "sqlite": "django.db.backends.sqlite3",
+    "postgres": "django.db.backends.postgresql",
+    "postgresql": "django.db.backends.postgresql",
+}
+
+
+def _env_flag(name, default=False):
+    return os.environ.get(name, str(int(default))).lower() in ("1", "true", "yes", "on")
+
+
+def sqlite_options(busy_timeout=20, mmap_size=128 * 1024 * 1024, cache_size=64 * 1024):
+    """
+    Connection OPTIONS that let several workers share one SQLite file: WAL so readers never
+    block the writer, a busy timeout (seconds) instead of immediate "database is locked"
+    errors, and BEGIN IMMEDIATE so a transaction takes the write lock up front rather than
+    failing when it tries to upgrade a read lock. cache_size is in KiB.
+    """
+    pragmas = [
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=NORMAL",
+        f"PRAGMA busy_timeout={int(busy_timeout * 1000)}",
+        f"PRAGMA mmap_size={int(mmap_size)}",
+        f"PRAGMA cache_size=-{int(cache_size)}",
+        "PRAGMA temp_store=MEMORY",
+    ]
+    return {
+        "timeout": busy_timeout,
+        "transaction_mode": "IMMEDIATE",
+        "init_command": ";".join(pragmas),
+    }
+
+
+def database_from_url(url, connect_timeout=5):
+    parts = urlsplit(url)
+    scheme = parts.scheme.split("+")[0]
+    if scheme not in ENGINES:
+        raise ValueError(f"Unsupported database URL scheme: {parts.scheme!r}")
+
+    if scheme == "sqlite":
+        path = unquote(parts.path)
+        if path.startswith("//"):
+            name = path[1:]
+        else:
+            name = BASE_DIR / path.lstrip("/")
+        database = {"ENGINE": ENGINES[scheme], "NAME": name}
+
+        if _env_flag("SQLITE_TUNING"):
+            database["OPTIONS"] = sqlite_options(
+                busy_timeout=float(os.environ.get("SQLITE_BUSY_TIMEOUT", 20)),
+                mmap_size=int(os.environ.get("SQLITE_MMAP_SIZE", 128 * 1024 * 1024)),
+                cache_size=int(os.environ.get("SQLITE_CACHE_SIZE", 64 * 1024)),
+            )
+        return database
+
+    options = dict(parse_qsl(parts.query))
+    options.setdefault("connect_timeout", connect_timeout)
+    database = {
+        "ENGINE": ENGINES[scheme],
+        "NAME": unquote(parts.path.lstrip("/")),
+        "USER": unquote(parts.username or ""),
+        "PASSWORD": unquote(parts.password or ""),
+        "HOST": parts.hostname or "",
+        "PORT": str(parts.port or ""),
+        # reuse connections between requests and check them before use instead of reconnecting per request
+        "CONN_MAX_AGE": int(os.environ.get("DATABASE_CONN_MAX_AGE", 60)),
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": options,
+    }
+
+    if _env_flag("DATABASE_POOL"):
+        # psycopg 3 connection pool shared by the threads of a worker; replaces persistent connections
+        database["CONN_MAX_AGE"] = 0
+        database["OPTIONS"]["pool"] = {
+            "min_size": int(os.environ.get("DATABASE_POOL_MIN_SIZE", 2)),
+            "max_size": int(os.environ.get("DATABASE_POOL_MAX_SIZE", 10)),
+            "timeout": int(os.environ.get("DATABASE_POOL_TIMEOUT", 10)),
+        }
+    return database
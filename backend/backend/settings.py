@@ -14,6 +14,8 @@ from pathlib import Path
 from datetime import timedelta
 import os
 
+from .database import database_from_url
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -59,16 +61,33 @@ ALLOWED_HOSTS = os.environ.get("DJANGO_ALLOWED_HOSTS","127.0.0.1,localhost").spl
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "api.auth.ClaimsJWTAuthentication",
     ),
     "DEFAULT_PERMISSION_CLASSES": (
         "rest_framework.permissions.IsAuthenticated",
     ),
+    # per view `throttle_scope`, counted in a table shared by all workers (api/throttling.py), one
+    # write to the primary per counted request; anonymous ranking requests answered from the response
+    # cache are not counted. Override with e.g. THROTTLE_RATES="login=10/min,upvote=120/min"
+    "DEFAULT_THROTTLE_RATES": {
+        "login": "20/min",
+        "login_username": "5/min",
+        "register": "10/hour",
+        "upvote": "60/min",
+        "ranking": "120/min",
+        **{scope.strip(): rate.strip() for scope, _, rate in
+           (entry.partition("=") for entry in os.environ.get("THROTTLE_RATES", "").split(",") if "=" in entry)},
+    },
+    # proxies in front of the backend whose X-Forwarded-For is trusted for the client address (1 behind nginx)
+    "NUM_PROXIES": int(os.environ.get("TRUSTED_PROXIES", 0)),
 }
 
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=45),
     "REFRESH_TOKEN_LIFETIME": timedelta(hours=1),
+    # tokens carry role, staff flags and tag ids, see api/auth.py
+    "TOKEN_OBTAIN_SERIALIZER": "api.auth.ClaimsTokenObtainPairSerializer",
+    "TOKEN_REFRESH_SERIALIZER": "api.auth.ClaimsTokenRefreshSerializer",
     }
 
 # Application definition
@@ -86,6 +105,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "api.timing.RequestTimingMiddleware",
+    "api.throttling.LoadSheddingMiddleware",
+    "api.routing.ReadYourWritesMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -112,18 +134,87 @@ TEMPLATES = [
     },
 ]
 
+# SERVER_MODE=asgi (entrypoint.sh) serves backend.asgi with uvicorn workers instead. The adrf views
+# (entries, rankings, categories, users/me) are async: under WSGI each of their requests runs
+# through async_to_sync, an event loop round trip on top of the sync work.
 WSGI_APPLICATION = "backend.wsgi.application"
 
 
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
 
+# Set DATABASE_URL (e.g. postgres://user:password@db:5432/debunk) to use another database;
+# see backend/database.py for the supported formats and pooling options.
+
 DATABASES = {
+    "default": database_from_url(os.environ.get("DATABASE_URL") or "sqlite:///DATA/db.sqlite3")
+}
+
+# Read replicas of DATABASE_URL, comma separated, for the public read views (see api/routing.py).
+# A user reads from the primary for REPLICA_PIN_SECONDS after changing something, and replicas
+# more than REPLICA_MAX_LAG_SECONDS behind or unreachable are skipped; both are rechecked every
+# REPLICA_CHECK_SECONDS in each worker. A replica that doesn't answer is given up on after
+# REPLICA_CONNECT_TIMEOUT seconds, unless its URL sets connect_timeout.
+REPLICA_CONNECT_TIMEOUT = int(os.environ.get("REPLICA_CONNECT_TIMEOUT", 2))
+DATABASE_REPLICAS = []
+for _number, _url in enumerate(filter(None, os.environ.get("DATABASE_REPLICA_URLS", "").split(",")), start=1):
+    DATABASES[f"replica{_number}"] = {
+        **database_from_url(_url.strip(), connect_timeout=REPLICA_CONNECT_TIMEOUT),
+        "TEST": {"MIRROR": "default"},
+    }
+    DATABASE_REPLICAS.append(f"replica{_number}")
+
+DATABASE_ROUTERS = ["api.routing.ReplicaRouter"]
+REPLICA_PIN_SECONDS = float(os.environ.get("REPLICA_PIN_SECONDS", 10))
+REPLICA_MAX_LAG_SECONDS = float(os.environ.get("REPLICA_MAX_LAG_SECONDS", 5))
+REPLICA_CHECK_SECONDS = float(os.environ.get("REPLICA_CHECK_SECONDS", 5))
+
+
+# Cache
+# Shared by all gunicorn workers, so version stamps bumped by one worker invalidate responses
+# cached by the others. Point it at memcached/redis with DJANGO_CACHE_BACKEND/DJANGO_CACHE_LOCATION.
+# The file and local memory caches drop a third of their keys, version stamps included, once they
+# hold MAX_ENTRIES (300 unless set); DJANGO_CACHE_MAX_ENTRIES (20000) leaves room for every cached page
+# of the entry, tag and ranking lists plus the entry details.
+
+CACHES = {
     "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "DATA" / "db.sqlite3",
+        "BACKEND": os.environ.get("DJANGO_CACHE_BACKEND", "django.core.cache.backends.filebased.FileBasedCache"),
+        "LOCATION": os.environ.get("DJANGO_CACHE_LOCATION", str(BASE_DIR / "DATA" / "cache")),
     }
 }
+if CACHES["default"]["BACKEND"].rsplit(".", 1)[0] in ("django.core.cache.backends.filebased",
+                                                       "django.core.cache.backends.locmem"):
+    # redis and memcached pass OPTIONS on to their clients
+    CACHES["default"]["OPTIONS"] = {"MAX_ENTRIES": int(os.environ.get("DJANGO_CACHE_MAX_ENTRIES", 20000))}
+
+# Rate limit counters (api/throttling.py) are kept in a database table, one atomic upsert per
+# counted request. THROTTLE_CACHE_BACKEND/THROTTLE_CACHE_LOCATION move them to a cache of their
+# own, which has to increment atomically: redis or memcached, not the file or local memory cache.
+if os.environ.get("THROTTLE_CACHE_BACKEND"):
+    CACHES["throttle"] = {
+        "BACKEND": os.environ["THROTTLE_CACHE_BACKEND"],
+        "LOCATION": os.environ.get("THROTTLE_CACHE_LOCATION", ""),
+    }
+
+RESPONSE_CACHE_TIMEOUT = int(os.environ.get("RESPONSE_CACHE_TIMEOUT", 300))
+
+# Server-Timing headers (SQL, serializer, auth and view time) for every response, not only staff ones,
+# and the duration from which a request is logged as slow by "api.timing" (see api/timing.py)
+SERVER_TIMING = os.environ.get("SERVER_TIMING", "0").lower() in ("1", "true", "yes", "on")
+SLOW_REQUEST_MS = float(os.environ.get("SLOW_REQUEST_MS", 1000))
+
+# load shedding (api/throttling.py): 503 for requests that waited longer than this in front of
+# busy workers, and above this many requests in flight in one worker process; 0 turns either off
+MAX_QUEUE_MS = float(os.environ.get("MAX_QUEUE_MS", 0))
+MAX_CONCURRENT_REQUESTS = int(os.environ.get("MAX_CONCURRENT_REQUESTS", 0))
+SHED_RETRY_AFTER = int(os.environ.get("SHED_RETRY_AFTER", 2))
+
+# bearer token Prometheus has to send to scrape /metrics (not checked when empty; nginx doesn't proxy it)
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+
+# seconds a worker trusts its tag catalogue (api/tags.py) before comparing version stamps again
+TAG_CATALOGUE_RECHECK = float(os.environ.get("TAG_CATALOGUE_RECHECK", 5))
 
 
 # Password validation
@@ -146,6 +237,18 @@ AUTH_PASSWORD_VALIDATORS = [
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# who sends protected media after the permission check: "django", "x-accel" (nginx) or "x-sendfile"
+PROTECTED_MEDIA_DELIVERY = os.environ.get("PROTECTED_MEDIA_DELIVERY", "django")
+PROTECTED_MEDIA_ACCEL_PREFIX = os.environ.get("PROTECTED_MEDIA_ACCEL_PREFIX", "/protected-media/")
+
+# limits for application scan uploads (api/uploads.py)
+SCAN_MAX_FILES = int(os.environ.get("SCAN_MAX_FILES", 10))
+SCAN_MAX_FILE_SIZE = int(os.environ.get("SCAN_MAX_FILE_SIZE", 10 * 1024 * 1024))
+SCAN_MAX_REQUEST_SIZE = int(os.environ.get("SCAN_MAX_REQUEST_SIZE", 50 * 1024 * 1024))
+
+# processes the job worker uses to make scan thumbnails and web copies
+SCAN_RENDITION_WORKERS = int(os.environ.get("SCAN_RENDITION_WORKERS", 2))
+
 # Internationalization
 # https://docs.djangoproject.com/en/6.0/topics/i18n/
 
@@ -18,17 +18,18 @@ from django.conf import settings
 from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import path, include, re_path
-from api.views import CreateUserView, ChangeProfileTypeView, CurrentUserView
-from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from api.views import CreateUserView, ChangeProfileTypeView, CurrentUserView, TokenObtainView
+from rest_framework_simplejwt.views import TokenRefreshView
 
 from api.views import UsersAll
 
 from api.views import UserDetailView, ProtectedMediaView
+from api.metrics import metrics_view
 
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/auth/register/", CreateUserView.as_view(), name="register-user"),
-    path("api/auth/token/", TokenObtainPairView.as_view(), name="get-token"),
+    path("api/auth/token/", TokenObtainView.as_view(), name="get-token"),
     path("api/auth/token/refresh/", TokenRefreshView.as_view(), name="refresh-token"),
     #path("api/auth/", include("rest_framework.urls")),
     path("api/users/<int:pk>/role/", ChangeProfileTypeView.as_view(), name="change-user-type"),
@@ -37,4 +38,5 @@ urlpatterns = [
     path("api/users/", UsersAll.as_view(), name="get-all-users"),
     path("api/users/<int:pk>/", UserDetailView.as_view(),name="user"),
     re_path(r"^api/media/(?P<path>.*)$", ProtectedMediaView.as_view()),
+    path("metrics", metrics_view, name="metrics"),
 ]
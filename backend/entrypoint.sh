@@ -2,4 +2,10 @@
 
 python manage.py migrate
 python manage.py createsuperuser --noinput
-exec gunicorn --bind 0.0.0.0:8000 --workers 17 backend.wsgi:application
\ No newline at end of file
+
+# SERVER_MODE=asgi serves the ASGI application with uvicorn workers, so the async read
+# views can overlap many in-flight requests in one worker; the default stays on sync WSGI workers.
+if [ "$SERVER_MODE" = "asgi" ]; then
+    exec gunicorn -c gunicorn.conf.py --bind 0.0.0.0:8000 --workers 17 --worker-class uvicorn_worker.UvicornWorker backend.asgi:application
+fi
+exec gunicorn -c gunicorn.conf.py --bind 0.0.0.0:8000 --workers 17 backend.wsgi:application
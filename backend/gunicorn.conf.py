@@ -0,0 +1,20 @@
+import os
+import shutil
+
+# Every worker writes its Prometheus samples to files here and /metrics adds them up (api/metrics.py).
+# Set before the workers are forked, which is when they import prometheus_client.
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/prometheus")
+
+
+def on_starting(server):
+    # samples left over from a previous run would be counted again
+    path = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    # drops the live-only samples of the exited worker; its counters and histograms are kept
+    multiprocess.mark_process_dead(worker.pid)
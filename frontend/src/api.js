@@ -92,10 +92,25 @@ api.interceptors.response.use(
 );
 
 
+// Listy z API przychodzą stronami po 20; idziemy po `next`, aż pobierzemy wszystko
+export async function getAllPages(url) {
+  const items = [];
+  let params = {};
+  for (;;) {
+    const res = await api.get(url, { params });
+    const data = res.data;
+    if (Array.isArray(data)) return [...items, ...data];
+
+    items.push(...(Array.isArray(data?.results) ? data.results : []));
+    if (!data?.next) return items;
+    params = Object.fromEntries(new URL(data.next, window.location.origin).searchParams);
+  }
+}
+
+
 // Requests (zgłoszenia)
 export async function getUnassignedRequests() {
-  const res = await api.get("/api/requests/unassigned/");
-  return res.data;
+  return getAllPages("/api/requests/unassigned/");
 }
 
 export async function getMyRequests() {
@@ -123,29 +138,12 @@ function isClosedRequest(r) {
 }
 
 export async function getAllOpenRequests() {
-  const res = await api.get("/api/requests/");
-  const data = res.data;
-
-  const list = Array.isArray(data)
-    ? data
-    : Array.isArray(data?.results)
-      ? data.results
-      : [];
-
+  const list = await getAllPages("/api/requests/");
   return list.filter((r) => !isClosedRequest(r));
 }
 
 export async function getClosedRequests() {
-  const res = await api.get("/api/requests/closed/");
-  const data = res.data;
-
-  const list = Array.isArray(data)
-    ? data
-    : Array.isArray(data?.results)
-      ? data.results
-      : [];
-
-  return list;
+  return getAllPages("/api/requests/closed/");
 }
 
 export default api;
@@ -1,5 +1,5 @@
 import { useEffect, useState } from "react";
-import api from "../api";
+import api, { getAllPages } from "../api";
 import useCurrentUser from "../components/useCurrentUser.jsx";
 
 const ROLE_STANDARD = "standard";
@@ -16,8 +16,7 @@ export default function Accounts() {
     setLoading(true);
     setError("");
     try {
-      const res = await api.get("/api/users/");
-      setUsers(res.data || []);
+      setUsers(await getAllPages("/api/users/"));
     } catch (e) {
       setError("Nie udało się pobrać listy użytkowników (sprawdź uprawnienia / token).");
     } finally {
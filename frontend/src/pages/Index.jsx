@@ -11,6 +11,12 @@ function Index() {
   const [entriesLoading, setEntriesLoading] = useState(false);
   const [entriesError, setEntriesError] = useState(null);
   const [busyById, setBusyById] = useState({});
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
+
+  // wpisy przychodzą stronami; z adresu `next` bierzemy tylko kursor
+  const cursorOf = (next) =>
+    next ? new URL(next, window.location.origin).searchParams.get("cursor") : null;
 
   const getTitleText = (entry) =>
     typeof entry?.title === "string" && entry.title.trim()
@@ -60,6 +66,7 @@ function Index() {
         const res = await api.get("/api/entries/");
         const data = Array.isArray(res.data) ? res.data : res.data?.results ?? [];
         setEntries(data);
+        setNextCursor(cursorOf(res.data?.next));
       } catch (e) {
         setEntriesError(e?.response?.data ?? e.message);
       } finally {
@@ -69,6 +76,21 @@ function Index() {
     fetchEntries();
   }, [user]);
 
+  const loadMore = async () => {
+    if (!nextCursor || loadingMore) return;
+    setLoadingMore(true);
+    try {
+      const res = await api.get("/api/entries/", { params: { cursor: nextCursor } });
+      const data = res.data?.results ?? [];
+      setEntries((prev) => [...prev, ...data.filter((e) => !prev.some((p) => p.id === e.id))]);
+      setNextCursor(cursorOf(res.data?.next));
+    } catch (e) {
+      setEntriesError(e?.response?.data ?? e.message);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const handleCreate = () => navigate("/entries/new");
   const handleEdit = (id) => navigate(`/entries/${id}/edit`);
 
@@ -98,8 +120,14 @@ function Index() {
     );
 
     try {
-      if (nextUpvoted) { await api.post(`/api/entries/${id}/upvote/`); }
-      else { await api.delete(`/api/entries/${id}/upvote/`); }
+      const res = nextUpvoted
+        ? await api.post(`/api/entries/${id}/upvote/`)
+        : await api.delete(`/api/entries/${id}/upvote/`);
+      if (typeof res.data?.upvotes_count === "number") {
+        setEntries((prev) =>
+          prev.map((e2) => e2.id === id ? { ...e2, upvotes_count: res.data.upvotes_count } : e2)
+        );
+      }
     } catch (e) {
       setEntries((prev) =>
         prev.map((e2) => e2.id === id ? { ...e2, user_vote: wasUpvoted, upvotes_count: prevCount } : e2)
@@ -219,6 +247,14 @@ function Index() {
           );
         })}
       </div>
+
+      {nextCursor && !entriesError && (
+        <div className="text-center mb-4">
+          <button type="button" className="btn btn-outline-secondary btn-sm px-4" disabled={loadingMore} onClick={loadMore}>
+            {loadingMore ? "Ładowanie..." : "Pokaż więcej"}
+          </button>
+        </div>
+      )}
     </div>
   );
 }
@@ -11,12 +11,12 @@ function Ranking() {
     const fetchRankings = async () => {
       try {
         const [entriesRes, domainsRes] = await Promise.all([
-          api.get("/api/entries/"),
+          api.get("/api/ranking/entries/"),
           api.get("/api/ranking/").catch(() => ({ data: [] }))
         ]);
 
-        const entriesData = Array.isArray(entriesRes.data) ? entriesRes.data : entriesRes.data?.results ?? [];
-        const sortedEntries = entriesData.sort((a, b) => b.upvotes_count - a.upvotes_count);
+        // posortowane po liczbie podbić na serwerze, spośród wszystkich wpisów
+        const sortedEntries = Array.isArray(entriesRes.data) ? entriesRes.data : entriesRes.data?.results ?? [];
 
         const domainsData = Array.isArray(domainsRes.data) ? domainsRes.data : domainsRes.data?.results ?? [];
 
@@ -36,6 +36,32 @@ export default function RequestDetail() {
     return Array.isArray(item.uploaded_scans) ? item.uploaded_scans : [];
   }, [item]);
 
+  // thumbnails are protected media too, so they are fetched with the auth header
+  const [thumbnails, setThumbnails] = useState({});
+
+  useEffect(() => {
+    let mounted = true;
+    const blobUrls = [];
+
+    scans.forEach(async (s) => {
+      const thumbnail = s.renditions?.thumbnail;
+      if (!thumbnail) return;
+      try {
+        const response = await api.get("/api" + new URL(thumbnail.url).pathname, { responseType: "blob" });
+        const blobUrl = window.URL.createObjectURL(response.data);
+        blobUrls.push(blobUrl);
+        if (mounted) setThumbnails((prev) => ({ ...prev, [s.id]: blobUrl }));
+      } catch (err) {
+        console.error(err);
+      }
+    });
+
+    return () => {
+      mounted = false;
+      blobUrls.forEach((url) => window.URL.revokeObjectURL(url));
+    };
+  }, [scans]);
+
   const openProtectedImage = async (fileUrl) => {
     try {
       const path = new URL(fileUrl).pathname;
@@ -138,13 +164,16 @@ export default function RequestDetail() {
                   {scans.map((s) => {
                     return (
                       <li key={s.id} className="list-group-item d-flex justify-content-between align-items-center">
+                        {thumbnails[s.id] && (
+                          <img src={thumbnails[s.id]} alt="" className="rounded me-3" style={{ maxHeight: "64px" }} />
+                        )}
                         <span className="text-truncate me-3" style={{ maxWidth: "300px" }}>
                           {s.image.split("/").pop()}
                         </span>
 
                         <button
                           className="btn btn-sm btn-outline-primary fw-bold"
-                          onClick={() => openProtectedImage(s.image)}
+                          onClick={() => openProtectedImage(s.renditions?.web?.url || s.image)}
                         >
                           <i className="fa-solid fa-eye me-2"></i> PODGLĄD
                         </button>
@@ -1,6 +1,6 @@
 import { useEffect, useMemo, useState } from "react";
 import { Link } from "react-router-dom";
-import api from "../api";
+import { getAllPages } from "../api";
 
 export default function RequestsList() {
   const [items, setItems] = useState([]);
@@ -12,8 +12,8 @@ export default function RequestsList() {
     async function load() {
       setError("");
       try {
-        const res = await api.get("/api/applications/");
-        if (mounted) setItems(Array.isArray(res.data) ? res.data : []);
+        const applications = await getAllPages("/api/applications/");
+        if (mounted) setItems(applications);
       } catch (e) {
         setError("Nie udało się wczytać próśb.");
       }